@@ -1,954 +1,82 @@
+# The backend comes first so that SCRAPUJ_IMPORT_TIMES=1 also times the GUI imports below
+from scrapuj_core import (TEMPLATE_DIR, COOKIE_DIR, OUTPUT_DIR, CACHE_DIR, LOG_DIR, PLAYWRIGHT_AVAILABLE, Scraper,
+                          ResponseCache, UrlSource, IMPORT_TIMES, import_report, sync_playwright)
 import json
-import requests
-from bs4 import BeautifulSoup
 import os
-import tempfile
-import pandas as pd
-import TemplateCreator_flet
+import sys
+import threading
 import time
-import random
 import logging
-from urllib.robotparser import RobotFileParser
-from urllib.parse import urljoin, urlparse
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import logging.handlers
+import multiprocessing
+from collections import deque
 import flet as ft
-import threading
-from lxml import html, etree
-from soupsieve.util import SelectorSyntaxError
-import sys
-import re
-
-LXML_AVAILABLE = True
-# Optional Playwright fallback (only used if installed)
-try:
-    from playwright.sync_api import sync_playwright
-
-    PLAYWRIGHT_AVAILABLE = True
-except Exception:
-    PLAYWRIGHT_AVAILABLE = False
-
-# ----------------------------
-# PyInstaller-Safe Path Setup
-# ----------------------------
-def get_base_path():
-    """Get the reliable base path, whether running as a script or PyInstaller exe."""
-    if getattr(sys, 'frozen', False):
-        # Running as a PyInstaller executable
-        return os.path.dirname(os.path.abspath(sys.executable))
-    else:
-        # Running as a normal Python script
-        return os.path.dirname(os.path.abspath(__file__))
-
-BASE_PATH = get_base_path()
-TEMPLATE_DIR = os.path.join(BASE_PATH, "templates")
-COOKIE_DIR = os.path.join(BASE_PATH, "cookies")
-OUTPUT_DIR = os.path.join(BASE_PATH, "output")
-
-# --- Create directories if they don't exist ---
-for path in [TEMPLATE_DIR, COOKIE_DIR, OUTPUT_DIR]:
-    os.makedirs(path, exist_ok=True)
 
 # ----------------------------
-# Configuration / Defaults
-# ----------------------------
-DEFAULT_USER_AGENT = (
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/119.0.0.0 Safari/537.36"
-)
-
-# A small sample list of user-agents for rotation (expand if desired)
-USER_AGENTS = [
-    DEFAULT_USER_AGENT,
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Safari/605.1.15",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
-]
-
-CAPTCHA_PATTERNS = re.compile(
-    r"captcha|recaptcha|prove you are human|verify you are human|are you human",
-    flags=re.IGNORECASE,
-)
-
-# Configure logging if you want to also write to a file (optional)
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-
-
-# ----------------------------
-# Scraper Logic (Backend)
+# Flet GUI (Frontend)
 # ----------------------------
-class Scraper:
-    def __init__(self, *, rotate_user_agent=True, min_delay=1.0, max_delay=3.0, proxies=None, retry_total=3):
-        """
-        rotate_user_agent: pick random UA for each session
-        min_delay/max_delay: random sleep between requests (seconds)
-        proxies: dict to pass to requests (e.g. {"http": "...", "https": "..."})
-        retry_total: number of retries for transient errors
-        """
-        self.template = {"selectors": {}}
-        self.rotate_user_agent = rotate_user_agent
-        self.min_delay = min_delay
-        self.max_delay = max_delay
-        self.proxies = proxies
-        self.retry_total = retry_total
-
-    def _make_session(self):
-        session = requests.Session()
-
-        # Choose user-agent
-        ua = random.choice(USER_AGENTS) if self.rotate_user_agent else DEFAULT_USER_AGENT
-        session.headers.update({
-            "User-Agent": ua,
-            "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-            "Referer": "https://www.google.com/",
-        })
-
-        # Retry strategy for transient network errors
-        retry_strategy = Retry(
-            total=self.retry_total,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
-
-        if self.proxies:
-            session.proxies.update(self.proxies)
-
-        return session
-
-    def read_template(self, path):
-        with open(path, encoding="utf-8") as f:
-            return f.read()
-
-    def clean_text(self, el):
-        """Clean a BeautifulSoup element, preserving paragraphs and line breaks."""
-        for br in el.find_all("br"):
-            br.replace_with("\n")
-        for p in el.find_all("p"):
-            p.insert_before("\n\n")
-        text = el.get_text()
-        lines = text.splitlines()
-        cleaned_lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in lines if line.strip()]
-        return "\n".join(cleaned_lines)
-
-    def _is_allowed_by_robots(self, url, user_agent):
-        """
-        Return True if either robots.txt allows the URL for our user-agent, or if checking fails (fail-open).
-        """
-        try:
-            parsed = urlparse(url)
-            robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
-            rp = RobotFileParser()
-            rp.set_url(robots_url)
-            rp.read()
-            allowed = rp.can_fetch(user_agent, url)
-            return allowed
-        except Exception:
-            # If robots.txt cannot be read, we choose to proceed (fail-open) — adjust if you prefer fail-closed.
-            return True
-
-    def _detect_captcha(self, text):
-        if not text:
-            return False
-        return bool(CAPTCHA_PATTERNS.search(text))
-
-    def _save_batch_urls(self, batch_links, output_file, log_callback=None):
-        """Appends a batch of links to a TXT file."""
-        if not batch_links:
-            return
-
-        try:
-            # Deduplicate links within this batch
-            unique_links = list(dict.fromkeys(batch_links))
-
-            # Use "a" mode to append. Add a newline to separate from previous batches.
-            with open(output_file, "a", encoding="utf-8") as f:
-                # Add a newline only if the file is not empty
-                if f.tell() > 0:
-                    f.write("\n")
-                f.write("\n".join(unique_links))
-
-            if log_callback:
-                log_callback(f"💾 Batch of {len(unique_links)} links saved to {os.path.basename(output_file)}")
-        except Exception as e:
-            log_msg = f"❌ Error saving URL batch: {e!r}"
-            logging.error(log_msg)
-            if log_callback:
-                log_callback(log_msg)
-
-    def _save_batch_json(self, batch_results, json_file, log_callback=None):
-        """Appends a batch of results to a JSON file."""
-        if not batch_results:
-            return
-
-        existing_data = []
-        try:
-            # Try to read existing data
-            if os.path.exists(json_file) and os.path.getsize(json_file) > 0:
-                with open(json_file, "r", encoding="utf-8") as f:
-                    existing_data = json.load(f)
-                if not isinstance(existing_data, list):
-                    existing_data = []  # Overwrite corrupted data
-        except json.JSONDecodeError:
-            if log_callback:
-                log_callback(f"⚠️ Corrupted JSON file found. Overwriting with new batch.")
-            existing_data = []  # Overwrite corrupted file
-        except Exception as e:
-            log_msg = f"❌ Error reading existing JSON file: {e!r}"
-            logging.error(log_msg)
-            if log_callback:
-                log_callback(log_msg)
-            # Don't stop, just overwrite
-            existing_data = []
-
-        try:
-            # Add new batch results to the list
-            existing_data.extend(batch_results)
-
-            # Write the entire updated list back to the file
-            with open(json_file, "w", encoding="utf-8") as f:
-                json.dump(existing_data, f, indent=2, ensure_ascii=False)
-
-            if log_callback:
-                log_callback(f"💾 Batch of {len(batch_results)} items saved to {os.path.basename(json_file)}")
-        except Exception as e:
-            log_msg = f"❌ Error saving JSON batch: {e!r}"
-            logging.error(log_msg)
-            if log_callback:
-                log_callback(log_msg)
-
-    def _log_error_to_file(self, error_file, url, error_message):
-        """Appends a failed URL and error message to a log file."""
-        if not error_file:
-            return
-        try:
-            # Ensure error_message is a single line
-            clean_message = str(error_message).replace('\n', ' ').replace('\r', '')
-            with open(error_file, "a", encoding="utf-8") as f:
-                f.write(f"{url}\t{clean_message}\n")
-        except Exception as e:
-            # Log to console if writing to file fails
-            logging.error(f"Failed to write to error log file: {e!r}")
-
-    def _save_batch_metadata(self, batch_results, template, export_folder, main_tag, xlsx_file, json_file,
-                             log_callback=None):
-        """Saves a batch for 'text_metadata' mode: appends to JSON, appends to XLSX, and writes new TXT files."""
-        if not batch_results:
-            return
-
-        # 1. Save to the master JSON file
-        self._save_batch_json(batch_results, json_file, log_callback)
-
-        # 2. Process and save XLSX and TXT files
-        df_existing = None
-        current_idx = 0
-        try:
-            # Check if xlsx file exists to get the starting index for new files
-            if os.path.exists(xlsx_file) and os.path.getsize(xlsx_file) > 0:
-                df_existing = pd.read_excel(xlsx_file)
-                current_idx = len(df_existing)
-        except Exception as e:
-            if log_callback:
-                log_callback(f"⚠️ Could not read existing metadata.xlsx: {e!r}. Creating a new one.")
-            df_existing = None
-            current_idx = 0
-
-        metadata_rows = []
-        new_txt_files_count = 0
-
-        try:
-            # 3. Create new TXT files and prepare metadata rows
-            for i, row in enumerate(batch_results, start=1):
-                # Don't create TXT files for rows that were errors
-                if "error" in row:
-                    metadata_row = dict(row)
-                    metadata_row["Nazwa pliku"] = "ERROR"
-                    metadata_rows.append(metadata_row)
-                    continue
-
-                txt_idx = current_idx + i  # This gives us file names 1, 2, ... 100, 101, ...
-                merged_content = []
-
-                # Merge tags in the user-defined order
-                if isinstance(main_tag, list):
-                    for tag in main_tag:
-                        content = row.get(tag, "")
-                        if isinstance(content, list):
-                            merged_content.extend(content)
-                        elif content:
-                            merged_content.append(str(content))
-                elif main_tag:  # Fallback for a single tag string (should be list from UI)
-                    content = row.get(main_tag, "")
-                    if isinstance(content, list):
-                        merged_content = content
-                    elif content:
-                        merged_content = [str(content)]
-
-                txt_filename = f"{txt_idx}.txt"
-                with open(os.path.join(export_folder, txt_filename), "w", encoding="utf-8") as f:
-                    f.write("\n\n".join(merged_content))  # Join with double newline
-
-                new_txt_files_count += 1
-
-                metadata_row = dict(row)  # keep everything
-                metadata_row["Nazwa pliku"] = txt_filename
-                metadata_rows.append(metadata_row)
-
-            # 4. Create new DataFrame and append to existing (if any)
-            df_new = pd.DataFrame(metadata_rows)
-
-            if df_existing is not None:
-                df_to_save = pd.concat([df_existing, df_new], ignore_index=True)
-            else:
-                df_to_save = df_new
-
-            # 5. Reorder columns
-            cols = df_to_save.columns.tolist()
-            if 'url' in cols:
-                cols.insert(0, cols.pop(cols.index('url')))
-            if 'Nazwa pliku' in cols:
-                cols.insert(0, cols.pop(cols.index('Nazwa pliku')))
-            df_to_save = df_to_save[cols]
-
-            # 6. Save the updated XLSX file
-            df_to_save.to_excel(xlsx_file, index=False)
-
-            if log_callback:
-                log_callback(f"💾 Batch of {new_txt_files_count} TXT files saved.")
-                log_callback(f"💾 Metadata for {len(metadata_rows)} items appended to {os.path.basename(xlsx_file)}")
-
-        except Exception as e:
-            log_msg = f"❌ Error saving metadata batch: {e!r}"
-            logging.error(log_msg)
-            if log_callback:
-                log_callback(log_msg)
-
-    def _extract_from_content(self, page_content, url, template, mode, resp_for_lxml=None):
-        """
-        Internal helper to extract data from raw HTML content based on the template and mode.
-        This is the core extraction logic, now reusable by both 'requests' and 'playwright' engines.
-        """
-        row = {"url": url}
-        lxml_tree = None
-        # soup = BeautifulSoup(page_content, "html.parser", from_encoding="utf-8")
-        soup = BeautifulSoup(page_content, "html.parser")
-        all_links_for_url_mode = []  # For 'urls_only' mode
-
-        # --- START MODIFICATION ---
-        selectors = template.get("selectors", {})
-        main_selectors = {k: v for k, v in selectors.items() if not k.endswith("_excluded")}
-        excluded_selectors = {k: v for k, v in selectors.items() if k.endswith("_excluded")}
-
-        # 1. PRZETWARZANIE WYKLUCZANIA
-        # Usuń z soup elementy pasujące do selektorów wykluczonych.
-        # Jest to konieczne, jeśli główny selektor (np. 'treść') zawiera te, które mają być pominięte (np. 'photo_excluded').
-        # Wykluczanie działa najlepiej z domyślnym parsowaniem.
-        for exclude_category, exclude_selector in excluded_selectors.items():
-            try:
-                # Z uwagi na to, że selektor wykluczający jest częścią drzewa,
-                # musi być parsowany za pomocą tego samego narzędzia co główny selektor.
-                # Używamy soup.select do znalezienia elementów.
-                excluded_elements = soup.select(exclude_selector)
-                for el in excluded_elements:
-                    el.decompose()  # Usuń element z drzewa BeautifulSoup
-                logging.debug(f"Successfully decomposed {len(excluded_elements)} elements for {exclude_category}")
-            except SelectorSyntaxError:
-                # Ignorujemy błędy składni CSS dla wykluczonych (nie obsługujemy XPath do usuwania)
-                logging.warning(f"Exclusion selector '{exclude_selector}' is not valid CSS and was skipped.")
-            except Exception as e:
-                logging.error(f"Error during exclusion for '{exclude_selector}': {e!r}")
-
-        # 2. PRZETWARZANIE GŁÓWNYCH SELEKTORÓW
-        # Iterujemy tylko po selektorach, które nie są 'excluded'
-        for category, selector in main_selectors.items():
-            # --- END MODIFICATION ---
-
-            els = []
+URLS_FIELD_LABEL = "Paste URLs Here (one per line)"
+# Engine choices that may open a browser (Playwright options are shown for them)
+BROWSER_ENGINE_OPTIONS = ("Playwright (customizable)", "Auto (Requests, Playwright when needed)")
+
+class LogSink:
+    """
+    Buffered log for the GUI. write() only appends to a ring buffer of the last `max_lines` lines
+    (and to a rotating log file holding the full log); a background thread hands the buffer to
+    `on_flush` at most `flushes_per_second` times per second, so busy runs don't stall on UI updates.
+    """
+
+    def __init__(self, on_flush, max_lines=500, flushes_per_second=4, log_file=None,
+                 max_file_bytes=5 * 1024 * 1024, backup_count=5, initial_text=""):
+        self.on_flush = on_flush
+        self.interval = 1.0 / max(flushes_per_second, 0.1)
+        self._lines = deque(initial_text.splitlines(), maxlen=max_lines)
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._file_log = None
+        if log_file:
             try:
-                # First, attempt to use the selector as a CSS selector
-                els = soup.select(selector)
-            except SelectorSyntaxError:
-                # If it's not valid CSS syntax, fall back to XPath
-                if not LXML_AVAILABLE:
-                    logging.warning(
-                        f"Invalid CSS selector '{selector}'. Install 'lxml' for XPath fallback.")
-                    continue
-
-                try:
-                    # Create the lxml tree from raw content if it doesn't exist
-                    if lxml_tree is None:
-                        # --- START FIX ---
-                        # Define the UTF-8 parser ONCE
-                        lxml_parser = html.HTMLParser(encoding="utf-8")
-
-                        if resp_for_lxml:
-                            # We used 'requests' which provides bytes
-                            lxml_tree = html.fromstring(resp_for_lxml, parser=lxml_parser)
-                        else:
-                            # We used Playwright which provides a string, so we encode it
-                            # AND pass the parser to tell lxml it's utf-8
-                            lxml_tree = html.fromstring(page_content.encode('utf-8'), parser=lxml_parser)
-                        # --- END FIX ---
-
-                    lxml_els = lxml_tree.xpath(selector)
-                    # Convert lxml elements to BeautifulSoup elements for consistent processing.
-                    els = [BeautifulSoup(etree.tostring(l_el, encoding='unicode'), 'html.parser')
-                           for l_el in lxml_els]
-                except Exception as e:
-                    logging.info(f"Playwright processing failed for {url}: {e!r}")
-                    els = []
-            except Exception as e:
-                logging.error(f"An unexpected error occurred with selector '{selector}': {e!r}")
-                els = []
-
-
-            if els:
-                texts = [self.clean_text(el) for el in els if el.get_text(strip=True)]
-                links = []
-                for el in els:
-                    if el.name == "a" and el.get("href"):
-                        links.append(urljoin(url, el["href"]))
-                    for a in el.find_all("a", href=True):
-                        links.append(urljoin(url, a["href"]))
-
-                if mode in ["text_only", "text_metadata"]:
-                    row[category] = texts[0] if len(texts) == 1 else texts
-                elif mode == "urls_only":
-                    all_links_for_url_mode.extend(links)  # Collect all links
-            else:
-                if mode in ["text_only", "text_metadata"]:
-                    row[category] = None
-
-        if mode == "urls_only":
-            row["urls"] = all_links_for_url_mode  # Add collected links to the row
-
-        return row
-
-    def _process_playwright_page(self, page, url, template, mode, scrape_script=None, log_callback=None,
-                                 cancel_flag=None):
-        """
-        Process a SINGLE page/URL using an EXISTING Playwright page object.
-        This contains the script execution and data extraction logic.
-        """
-        collected_rows = []
-        scrape_called_by_user = False  # Flag to track user call
-
-        try:
-            # --- Browser/Context setup is REMOVED from here ---
-
-            # 1. Navigate to the new URL
-            def handle_route(route):
-                # Block images, stylesheets, and fonts
-                if (route.request.resource_type in ["image", "stylesheet", "font"]):
-                    route.abort()
-                else:
-                    route.continue_()
-
-            # Apply the handler to all requests
-            page.route(re.compile(r".*"), handle_route)
-            page.goto(url)
-            page.wait_for_load_state("load")
-
-            # 2. Define the scrape() function for the user
-            def user_scrape_function():
-                """Internal function exposed to user script as 'scrape()'."""
-                nonlocal scrape_called_by_user
-                scrape_called_by_user = True
-                try:
-                    if log_callback:
-                        log_callback(f"ℹ️ scrape() called by script on {page.url}")
-                    current_html = page.content()
-
-                    # Use the core extraction helper
-                    scraped_row = self._extract_from_content(
-                        page_content=current_html,
-                        url=page.url,  # Use current page URL, might have changed
-                        template=template,
-                        mode=mode
-                    )
-                    collected_rows.append(scraped_row)
-                    if log_callback:
-                        log_callback(f"✅ scrape() successful, {len(scraped_row) - 1} categories found.")
-                except Exception as e:
-                    logging.error(f"Error during user-called scrape(): {e!r}")
-                    if log_callback:
-                        log_callback(f"❌ Error during user-called scrape(): {e!r}")
-
-
-            # 3. EXECUTE USER SCRIPT
-            if scrape_script:
-                logging.info(f"Executing scrape action script for {url}")
-                try:
-                    exec_globals = {
-                        'page': page,
-                        'time': time,
-                        'scrape': user_scrape_function,
-                    }
-                    if log_callback:
-                        exec_globals['log'] = log_callback
-                    if cancel_flag:
-                        exec_globals['is_cancelled'] = cancel_flag
-
-                    exec(scrape_script, exec_globals)
-                    logging.info(f"Successfully executed script for {url}")
-
-                except Exception as e:
-                    logging.error(f"Error executing scrape script for {url}: {e!r}")
-                    if log_callback:
-                        log_callback(f"❌ Script error on {url}: {e!r}")
-
-            # 4. AUTO-SCRAPE (Fallback)
-            if not scrape_called_by_user:
-                # --- START MODIFICATION ---
-                # Only log if a script *ran* but didn't call scrape().
-                # If no script was provided, this is just noise and slows down the app.
-                if log_callback and scrape_script:
-                    log_callback(f"ℹ️ Script finished. Auto-scraping final page state for {url}...")
-                # --- END MODIFICATION ---
-                try:
-                    current_html = page.content()
-                    scraped_row = self._extract_from_content(
-                        page_content=current_html,
-                        url=page.url,
-                        template=template,
-                        mode=mode
-                    )
-                    collected_rows.append(scraped_row)
-
-
-                except Exception as e:
-                    logging.error(f"Error during auto-scrape: {e!r}")
-                    if log_callback:
-                        log_callback(f"❌ Error during auto-scrape: {e!r}")
-
-
-
-            return {"status": "ok", "scraped_rows": collected_rows}  # Return collected data
-        except Exception as e:
-            logging.info(f"Playwright processing failed for {url}: {e!r}")
-            return {"status": "error", "message": str(e)}
-
-    def _run_playwright_session(self, urls, template, mode, scrape_script, log_callback, headless, cancel_flag,
-                                cookie_file_path, timeout=60000,
-                                # --- START: Add batch save params ---
-                                output_file=None, json_file=None, xlsx_file=None,
-                                export_folder=None, main_tag_keys=None,
-                                # --- END: Add batch save params ---
-                                error_log_file=None
-                                ):
-        """
-        Launches ONE Playwright browser instance, loads cookies once,
-        and iterates through all URLs, saving in batches.
-        """
-        all_results = []  # To store results from ALL URLs
-        num_urls = len(urls)
+                self._file_log = logging.getLogger(f"scrapuj.gui.{os.path.abspath(log_file)}")
+                self._file_log.propagate = False
+                self._file_log.setLevel(logging.INFO)
+                if not self._file_log.handlers:
+                    handler = logging.handlers.RotatingFileHandler(
+                        log_file, maxBytes=max_file_bytes, backupCount=backup_count, encoding="utf-8")
+                    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                    self._file_log.addHandler(handler)
+            except OSError as e:
+                logging.warning(f"Could not open log file {log_file}: {e}")
+                self._file_log = None
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def write(self, message):
+        with self._lock:
+            self._lines.extend(str(message).splitlines() or [""])
+        if self._file_log:
+            self._file_log.info(message)
+        self._dirty.set()
+
+    def clear(self):
+        """Empties the on-screen buffer (the log file keeps everything)."""
+        with self._lock:
+            self._lines.clear()
+        self._dirty.set()
+
+    def text(self):
+        with self._lock:
+            return "\n".join(self._lines)
+
+    def flush(self):
+        self._dirty.clear()
+        self.on_flush(self.text())
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            self.flush()
+            time.sleep(self.interval)
 
-        # --- START: Add batch lists ---
-        batch_results = []
-        batch_links = []
-        # --- END: Add batch lists ---
 
-        if not PLAYWRIGHT_AVAILABLE:
-            if log_callback:
-                log_callback("❌ Playwright is not installed.")
-            return []  # Return empty list
-
-        try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=headless)
-
-                # --- Load cookies ONCE ---
-                context_args = {}
-                if cookie_file_path:
-                    try:
-                        if os.path.exists(cookie_file_path) and os.path.getsize(cookie_file_path) > 0:
-                            with open(cookie_file_path, 'r', encoding='utf-8') as f:
-                                json.load(f)  # Test load
-                            context_args["storage_state"] = cookie_file_path
-                            if log_callback:
-                                log_callback(f"ℹ️ Loading session from {os.path.basename(cookie_file_path)}")
-                        else:
-                            if log_callback:
-                                log_callback(f"⚠️ Cookie file not found or is empty. Proceeding without session.")
-                    except Exception as e:
-                        if log_callback:
-                            log_callback(f"❌ Error loading cookie file: {e!r}. Proceeding without session.")
-
-                context = browser.new_context(**context_args)
-                page = context.new_page()  # Create the FIRST page
-                page.set_default_timeout(timeout)
-
-                # --- NOW we loop through the URLs ---
-                for idx, url in enumerate(urls, start=1):
-                    if cancel_flag and cancel_flag():
-                        if log_callback:
-                            log_callback("⚠️ Scraping canceled by user.")
-                        break
-
-                    try:
-                        if url.startswith("view-source:"):
-                            url = url[len("view-source:"):]
-
-                        # Check robots.txt (using default UA for check)
-                        if not self._is_allowed_by_robots(url, DEFAULT_USER_AGENT):
-                            msg = f"⚠️ [{idx}/{num_urls}] Skipped {url} — disallowed by robots.txt"
-                            error_row = {"url": url, "error": "Disallowed by robots.txt"}
-                            self._log_error_to_file(error_log_file, url, "Disallowed by robots.txt")
-                            # all_results.append(error_row)
-                            # --- START: Add to batch ---
-                            if mode != "urls_only":
-                                batch_results.append(error_row)
-                            # --- END: Add to batch ---
-                            if log_callback:
-                                log_callback(msg)
-                            continue
-
-                        if log_callback:
-                            log_callback(f"🚀 [{idx}/{num_urls}] Navigating to {url}...")
-
-                        # Call the refactored processing function
-                        page_result = self._process_playwright_page(
-                            page=page,
-                            url=url,
-                            template=template,
-                            mode=mode,
-                            scrape_script=scrape_script,
-                            log_callback=log_callback,
-                            cancel_flag=cancel_flag
-                        )
-
-                        # Handle the result directly instead of raising an error
-                        if page_result["status"] == "ok":
-                            #all_results.extend(page_result["scraped_rows"])
-                            # --- START: Add to batch ---
-                            if mode == "urls_only":
-                                for r in page_result["scraped_rows"]:
-                                    batch_links.extend(r.get("urls", []))
-                            else:
-                                batch_results.extend(page_result["scraped_rows"])
-                            # --- END: Add to batch ---
-
-                            if log_callback:
-                                log_callback(
-                                    f"✅ [{idx}/{num_urls}] {url} scraped ({len(page_result['scraped_rows'])} items found)")
-                        else:
-                            # Page processing failed, log it and append the error
-                            error_message = page_result.get('message', 'Unknown Playwright processing error')
-                            self._log_error_to_file(error_log_file, url, error_message)
-                            logging.warning(f"Playwright processing failed for {url}: {error_message}")
-                            if log_callback:
-                                log_callback(f"❌ [{idx}/{num_urls}] {url} error: {error_message}")
-
-                            error_row = {"url": url, "error": error_message}
-                            #all_results.append(error_row)
-                            # --- START: Add to batch ---
-                            if mode != "urls_only":
-                                batch_results.append(error_row)
-                            # --- END: Add to batch ---
-
-                            # --- START THE COMBINED FIX ---
-                            # The page is broken. We must close it and create a new one.
-                            if log_callback:
-                                log_callback(f"ℹ️ Attempting to recover Playwright session...")
-                            try:
-                                page.close()  # Close the broken page
-                                page = context.new_page()  # Create a fresh page from the same context
-                                page.set_default_timeout(timeout)  # Re-apply the timeout
-                                if log_callback:
-                                    log_callback(f"✅ Playwright session recovered. Continuing to next URL.")
-                            except Exception as recovery_e:
-                                # If this recovery fails, the whole context or browser is dead.
-                                logging.error(f"Critical error: Failed to recover Playwright context: {recovery_e!r}")
-                                if log_callback:
-                                    log_callback(f"💥 CRITICAL: Playwright context is unresponsive. Aborting run.")
-                                break  # Break out of the for-loop entirely.
-                            # --- END THE COMBINED FIX ---
-
-
-                    except Exception as e:
-                        # This 'except' catches other errors (e.g., robots.txt failure)
-                        logging.error(f"Error processing {url}: {e!r}")
-                        if log_callback:
-                            log_callback(f"❌ [{idx}/{num_urls}] {url} error: {e!r}")
-                        error_row = {"url": url, "error": repr(e)}
-                        self._log_error_to_file(error_log_file, url, repr(e))
-                        # all_results.append(error_row)  # Log error for this URL
-                        # --- START: Add to batch ---
-                        if mode != "urls_only":
-                            batch_results.append(error_row)
-                        # --- END: Add to batch ---
-
-                    # --- START: Batch Save Logic ---
-                    if (idx % 100 == 0 or idx == num_urls) and not (cancel_flag and cancel_flag()):
-                        if log_callback:
-                            log_callback(f"💾 Saving batch... (up to URL {idx}/{num_urls})")
-                        try:
-                            if mode == "urls_only":
-                                self._save_batch_urls(batch_links, output_file, log_callback)
-                                batch_links.clear()
-                            elif mode == "text_only":
-                                self._save_batch_json(batch_results, json_file, log_callback)
-                                batch_results.clear()
-                            elif mode == "text_metadata":
-                                self._save_batch_metadata(batch_results, template, export_folder, main_tag_keys,
-                                                          xlsx_file, json_file, log_callback)
-                                batch_results.clear()
-                        except Exception as e:
-                            log_msg = f"❌ CRITICAL: Failed to save batch! {e!r}"
-                            logging.error(log_msg)
-                            if log_callback:
-                                log_callback(log_msg)
-                    # --- END: Batch Save Logic ---
-
-                    # Apply delay *between* requests
-                    time.sleep(random.uniform(self.min_delay, self.max_delay))
-
-                # --- Loop finished ---
-                context.close()
-                browser.close()
-        except Exception as e:
-            logging.error(f"A critical Playwrisght session error occurred: {e!r}")
-            if log_callback:
-                log_callback(f"💥 A critical Playwright error occurred: {e!r}")
-        return []
-        #return all_results  # Return the full list of results
-
-    def run_scraper_from_content(self, template_content, urls_text, output_name, mode="text_only",
-                                 progress_callback=None, cancel_flag=None, engine="requests", scrape_script=None,
-                                 headless=True, cookie_file_path=None,
-                                 # --- START: Add main_tag_keys ---
-                                 main_tag_keys=None
-                                 # --- END: Add main_tag_keys ---
-                                 ):
-        try:
-            template = json.loads(template_content)
-        except json.JSONDecodeError:
-            return {"status": "error", "message": "Invalid JSON in template file."}
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w", encoding="utf-8") as tmp:
-            json.dump(template, tmp, indent=2, ensure_ascii=False)
-            tmp_filename = tmp.name
-
-        result = self.run_scraper(tmp_filename, urls_text, output_name, mode, progress_callback, cancel_flag, engine,
-                                  scrape_script, headless, cookie_file_path=cookie_file_path,
-                                  # --- START: Pass main_tag_keys ---
-                                  main_tag_keys=main_tag_keys
-                                  # --- END: Pass main_tag_keys ---
-                                  )
-        os.remove(tmp_filename)
-        return result
-
-    # --- MODIFIED ---
-        # --- MODIFIED ---
-    def run_scraper(self, template_file, urls_text, output_name, mode="text_only",
-                    progress_callback=None, cancel_flag=None, engine="requests", scrape_script=None, headless=True,
-                    cookie_file_path=None,
-                    # --- START: Add main_tag_keys ---
-                    main_tag_keys=None
-                    # --- END: Add main_tag_keys ---
-                    ):
-        try:
-            with open(template_file, encoding="utf-8") as f:
-                template = json.load(f)
-        except FileNotFoundError:
-            return {"status": "error", "message": f"Template {template_file} not found."}
-
-        # --- START: Define all output paths ---
-        ext = ".json" if mode in ["text_only", "text_metadata"] else ".txt"
-        output_file = os.path.join(OUTPUT_DIR, output_name + ext)  # TXT file or "text_only" JSON
-
-        export_folder = None
-        json_file = None  # Master JSON file (for text_only or metadata)
-        xlsx_file = None  # Metadata XLSX file
-        error_log_file = os.path.join(OUTPUT_DIR, output_name + "_errors.txt")  # <-- ADD THIS
-
-        # --- Clear old files for a fresh run ---
-        if os.path.exists(error_log_file): os.remove(error_log_file)  # <-- ADD THIS
-
-        if mode == "text_metadata":
-            export_folder = os.path.join(OUTPUT_DIR, output_name)
-            os.makedirs(export_folder, exist_ok=True)
-            # This JSON file stores all raw scraped data for metadata mode
-            json_file = os.path.join(export_folder, "scraped_data.json")
-            xlsx_file = os.path.join(export_folder, "metadane.xlsx")
-            # Clear old files
-            if os.path.exists(json_file): os.remove(json_file)
-            if os.path.exists(xlsx_file): os.remove(xlsx_file)
-        elif mode == "text_only":
-            json_file = output_file
-            # Clear old file for a fresh run
-            if os.path.exists(json_file): os.remove(json_file)
-        elif mode == "urls_only":
-            # Clear old file for a fresh run
-            if os.path.exists(output_file): os.remove(output_file)
-        # --- END: Define all output paths ---
-
-        urls = [u.strip() for u in urls_text.splitlines() if u.strip()]
-        num_urls = len(urls)
-        results = []  # This will hold ALL results for the final return
-
-        # --- START: Add batch lists ---
-        batch_results = []
-        batch_links = []
-        # --- END: Add batch lists ---
-
-        # --- REFACTORED LOGIC ---
-        if engine == "playwright":
-            # Playwright engine handles its own session and loop
-            results = self._run_playwright_session(
-                urls=urls,
-                template=template,
-                mode=mode,
-                scrape_script=scrape_script,
-                log_callback=progress_callback,
-                headless=headless,
-                cancel_flag=cancel_flag,
-                cookie_file_path=cookie_file_path,
-                # --- START: Pass batch params ---
-                output_file=output_file,
-                json_file=json_file,
-                xlsx_file=xlsx_file,
-                export_folder=export_folder,
-                main_tag_keys=main_tag_keys,
-                # --- END: Pass batch params ---
-                error_log_file = error_log_file
-            )
-        else:
-            # 'requests' engine uses the original loop-per-URL logic
-            session = self._make_session()
-            ua_for_robots = session.headers.get("User-Agent", DEFAULT_USER_AGENT)
-
-            for idx, url in enumerate(urls, start=1):
-                if cancel_flag and cancel_flag():
-                    if progress_callback:
-                        progress_callback("⚠️ Scraping canceled by user.")
-                    break
-
-                scraped_row = None
-                error_row = None
-
-                try:
-                    if url.startswith("view-source:"):
-                        url = url[len("view-source:"):]
-
-                    if not self._is_allowed_by_robots(url, ua_for_robots):
-                        msg = f"⚠️ [{idx}/{len(urls)}] Skipped {url} — disallowed by robots.txt"
-                        error_row = {"url": url, "error": "Disallowed by robots.txt"}
-                        self._log_error_to_file(error_log_file, url, "Disallowed by robots.txt")  # <-- ADD THIS
-                        if progress_callback:
-                            progress_callback(msg)
-                    else:
-                        page_content = None
-                        resp_for_lxml = None
-
-                        time.sleep(random.uniform(self.min_delay, self.max_delay))
-
-                        # This is now ONLY the 'requests' logic
-                        max_retries = 3
-                        for attempt in range(1, max_retries + 1):
-                            try:
-                                resp = session.get(url, timeout=15)
-                                resp.raise_for_status()
-                                soup_check = BeautifulSoup(resp.content, "html.parser")
-                                if soup_check.get_text(strip=True):
-                                    page_content = resp.content
-                                    resp_for_lxml = resp.content
-                                    break
-                                else:
-                                    if progress_callback:
-                                        progress_callback(
-                                            f"⚠️ [{idx}/{len(urls)}] Empty content on attempt {attempt}, retrying...")
-                                    time.sleep(random.uniform(2, 5))
-                            except requests.exceptions.RequestException as e:
-                                if progress_callback:
-                                    progress_callback(
-                                        f"❌ [{idx}/{len(urls)}] Request error on attempt {attempt}: {e!r}")
-                                time.sleep(random.uniform(2, 5))
-                        else:
-                            raise ConnectionError(f"Failed to get content from {url} after {max_retries} retries.")
-
-                        if not page_content:
-                            raise ConnectionError(f"Failed to fetch content from {url} using {engine} engine.")
-
-                        scraped_row = self._extract_from_content(
-                            page_content=page_content,
-                            url=url,
-                            template=template,
-                            mode=mode,
-                            resp_for_lxml=resp_for_lxml
-                        )
-                        if progress_callback:
-                            progress_callback(f"✅ [{idx}/{len(urls)}] {url} scraped")
-
-                except Exception as e:
-                    error_row = {"url": url, "error": repr(e)}
-                    self._log_error_to_file(error_log_file, url, repr(e))
-                    if progress_callback:
-                        progress_callback(f"❌ [{idx}/{len(urls)}] {url} error: {repr(e)}")
-
-                # --- START: Add to results and batch ---
-                if scraped_row:
-                    #results.append(scraped_row)
-                    if mode == "urls_only":
-                        batch_links.extend(scraped_row.get("urls", []))
-                    else:
-                        batch_results.append(scraped_row)
-                elif error_row:
-                    #results.append(error_row)
-                    if mode != "urls_only":
-                        batch_results.append(error_row)
-                # --- END: Add to results and batch ---
-
-                # --- START: Batch Save Logic ---
-                if (idx % 100 == 0 or idx == num_urls) and not (cancel_flag and cancel_flag()):
-                    if progress_callback:
-                        progress_callback(f"💾 Saving batch... (up to URL {idx}/{num_urls})")
-                    try:
-                        if mode == "urls_only":
-                            self._save_batch_urls(batch_links, output_file, progress_callback)
-                            batch_links.clear()
-                        elif mode == "text_only":
-                            self._save_batch_json(batch_results, json_file, progress_callback)
-                            batch_results.clear()
-                        elif mode == "text_metadata":
-                            self._save_batch_metadata(batch_results, template, export_folder, main_tag_keys,
-                                                      xlsx_file, json_file, progress_callback)
-                            batch_results.clear()
-                    except Exception as e:
-                        log_msg = f"❌ CRITICAL: Failed to save batch! {e!r}"
-                        logging.error(log_msg)
-                        if progress_callback:
-                            # --- This is the fix ---
-                            progress_callback(log_msg)
-                # --- END: Batch Save Logic ---
-
-        # --- END REFACTORED LOGIC ---
-
-        # --- START: Remove old save logic ---
-        # The entire "Save output" block is GONE.
-        # --- END: Remove old save logic ---
-
-        # --- START: Determine final output path for message ---
-        final_output_path = output_file
-        if mode == "text_metadata":
-            final_output_path = export_folder
-        elif mode == "text_only":
-            final_output_path = json_file
-        # --- END: Determine final output path for message ---
-
-        return {"status": "ok", "filename": final_output_path, "count": len(results), "results": results,
-                "template": template}
-
-
-
-
-# ----------------------------
-# Flet GUI (Frontend)
-# ----------------------------
 class ScraperApp(ft.Column):
     def __init__(self, page: ft.Page):
         super().__init__()
@@ -959,7 +87,9 @@ class ScraperApp(ft.Column):
         self._cancel_scraping = False
 
         # --- Backend and State ---
-        self.scraper = Scraper(rotate_user_agent=True, min_delay=1.0, max_delay=3.0)
+        self.scraper = Scraper(rotate_user_agent=True, min_delay=1.0, max_delay=3.0, workers=8, browser_pages=4,
+                               robots_cache_file=os.path.join(CACHE_DIR, "robots_cache.json"))
+        self.response_cache = None  # Opened on the first run with "Use response cache" ticked
         self.template_path_str = None
         self.template_content = None
         self.template_tags = []
@@ -971,6 +101,9 @@ class ScraperApp(ft.Column):
 
         # Initialize all controls
         self.initialize_controls()
+        self.log_sink = LogSink(self._show_log, max_lines=500, flushes_per_second=4,
+                                log_file=os.path.join(LOG_DIR, "scrapuj.log"),
+                                initial_text=self.log_field.value)
 
         # --- File Picker Setup ---
         self.template_file_picker = ft.FilePicker(on_result=self.on_template_select_result)
@@ -1007,7 +140,8 @@ class ScraperApp(ft.Column):
         )
 
         # --- Step 2 ---
-        self.urls_field = ft.TextField(label="Paste URLs Here (one per line)", multiline=True, min_lines=20,
+        self.urls_file_path = None  # Set when URLs are streamed from a file instead of the text box
+        self.urls_field = ft.TextField(label=URLS_FIELD_LABEL, multiline=True, min_lines=20,
                                        max_lines=20, border=ft.InputBorder.OUTLINE, expand=True)
         self.load_urls_button = ft.IconButton(
             icon=ft.Icons.UPLOAD_FILE, tooltip="Load URLs from .txt file",
@@ -1015,16 +149,30 @@ class ScraperApp(ft.Column):
                 dialog_title="Select a TXT file with URLs", allowed_extensions=["txt"], allow_multiple=False, initial_directory=OUTPUT_DIR
             )
         )
+        self.clear_urls_file_button = ft.IconButton(
+            icon=ft.Icons.CLEAR, tooltip="Stop using the URL file", visible=False,
+            on_click=self.clear_urls_file_click
+        )
 
         # --- Step 3 ---
         self.output_name_field = ft.TextField(label="Output Name (for file or folder)", value="output", expand=True)
 
         self.engine_menu = ft.Dropdown(
-            options=[ft.DropdownOption(e) for e in ["Requests (faster)", "Playwright (customizable)"]],
+            options=[ft.DropdownOption(e) for e in
+                     ["Requests (faster)", "Async (high concurrency)", "Playwright (customizable)",
+                      "Auto (Requests, Playwright when needed)"]],
             value="Requests (faster)",
             label="Choose Scraping Engine", on_change=self.engine_changed
         )
         self.headless_cb = ft.Checkbox(label="Run Headless (invisible browser)", value=True)
+        self.use_cache_cb = ft.Checkbox(
+            label="Use response cache (keeps pages in cache/http to skip unchanged ones on re-runs)", value=False,
+            on_change=self.use_cache_changed)
+        self.replay_cache_cb = ft.Checkbox(
+            label="Replay from cache (offline, re-uses pages downloaded by earlier runs)", value=False,
+            disabled=True)
+        self.resume_cb = ft.Checkbox(
+            label="Resume the unfinished run with this output name (skips URLs already saved)", value=False)
         self.playwright_actions_btn = ft.ElevatedButton("Playwright Script...",
                                                          on_click=self.open_playwright_script_editor) # RENAMED
 
@@ -1126,7 +274,9 @@ class ScraperApp(ft.Column):
 
         # Get start URL (first URL from list, or google)
         start_url = "https://google.com"
-        if self.urls_field.value and self.urls_field.value.strip():
+        if self.urls_file_path:
+            start_url = next(iter(UrlSource(path=self.urls_file_path)), start_url)
+        elif self.urls_field.value and self.urls_field.value.strip():
             start_url = self.urls_field.value.strip().splitlines()[0]
 
         # Run the browser part in a thread to not freeze the UI
@@ -1229,34 +379,20 @@ class ScraperApp(ft.Column):
             self.log(f"❌ Error during cookie saving: {ex}")
 
     def log(self, message: str):
-        """Thread-safe method to append messages to the log field."""
-        try:
-            # --- START FIX: Rolling log to prevent MemoryError ---
-            max_lines = 500  # Keep the last 500 lines
-
-            # Get current lines, split by newline
-            current_lines = self.log_field.value.splitlines()
-
-            # Get the last (max_lines - 1) lines
-            if len(current_lines) > max_lines:
-                trimmed_lines = current_lines[-(max_lines - 1):]
-            else:
-                trimmed_lines = current_lines
-
-            # Add the new message
-            trimmed_lines.append(message)
-
-            # Re-join and set the new value
-            self.log_field.value = "\n".join(trimmed_lines)
-            # --- END FIX ---
+        """Thread-safe method to append messages to the log field (shown on the next flush)."""
+        self.log_sink.write(message)
 
+    def _show_log(self, text):
+        """Called by the log sink (at most a few times per second) to push the buffered log to the UI."""
+        try:
+            self.log_field.value = text
             self.page.update()
         except Exception as e:
             # If this fails, the Flet UI is dead or unresponsive.
             # We MUST catch this exception, or the whole app will crash.
             # We print to the console as a fallback.
             print(f"--- FLET UI LOGGING FAILED ---")
-            print(f"Original Message: {message}")
+            print(f"Last lines: {text[-500:]}")
             print(f"Error: {e!r}")
             print(f"-------------------------------")
 
@@ -1306,15 +442,19 @@ class ScraperApp(ft.Column):
         """Returns the main content Column for the current step."""
         # Disable controls if scraper is running
         is_disabled = self.is_running
-        is_playwright = self.engine_menu.value == "Playwright (customizable)"
+        is_playwright = self.engine_menu.value in BROWSER_ENGINE_OPTIONS
         self.template_button.disabled = is_disabled
-        self.urls_field.disabled = is_disabled
+        self.urls_field.disabled = is_disabled or bool(self.urls_file_path)
+        self.clear_urls_file_button.disabled = is_disabled
         self.load_urls_button.disabled = is_disabled
         self.output_name_field.disabled = is_disabled
         self.engine_menu.disabled = is_disabled
         self.headless_cb.disabled = not is_playwright or self.is_running
         self.playwright_actions_btn.disabled = not is_playwright or self.is_running
         self.mode_menu.disabled = is_disabled
+        self.use_cache_cb.disabled = is_disabled
+        self.replay_cache_cb.disabled = is_disabled or not self.use_cache_cb.value
+        self.resume_cb.disabled = is_disabled
         self.run_button.visible = not is_disabled
         self.cancel_button.visible = is_disabled
 
@@ -1338,7 +478,8 @@ class ScraperApp(ft.Column):
                 # The Column is the content of our styled box
                 content=ft.Column([
                     ft.Text("Step 2: Paste URLs to scrape or load from a file.", size=18),
-                    ft.Stack([self.urls_field, ft.Row([self.load_urls_button], top=5, right=5)])
+                    ft.Stack([self.urls_field, ft.Row([self.clear_urls_file_button, self.load_urls_button],
+                                                      top=5, right=5)])
                 ], spacing=30, horizontal_alignment=ft.CrossAxisAlignment.CENTER),
                 # --- Styling Properties for the Container ---
                 padding=10,  # Add 30 pixels of space inside the container
@@ -1360,6 +501,9 @@ class ScraperApp(ft.Column):
                     self.engine_menu,
                     self.playwright_options_card,
                     self.mode_menu,
+                    self.use_cache_cb,
+                    self.replay_cache_cb,
+                    self.resume_cb,
                     self.run_button,
                     # Keep this as STRETCH to affect all other controls
                 ], spacing=15 if is_playwright else 30, horizontal_alignment=ft.CrossAxisAlignment.STRETCH),
@@ -1409,16 +553,25 @@ class ScraperApp(ft.Column):
         self.show_view()
 
     def engine_changed(self, e):
-        is_playwright = e.control.value == "Playwright (customizable)"
+        is_playwright = e.control.value in BROWSER_ENGINE_OPTIONS
         self.playwright_options_card.visible = is_playwright
         self.headless_cb.disabled = not is_playwright or self.is_running
         self.playwright_actions_btn.disabled = not is_playwright or self.is_running
         self.update()
         self.show_view()
 
+    def use_cache_changed(self, e):
+        # Replaying needs the cache; unticking it also switches replay off
+        if not self.use_cache_cb.value:
+            self.replay_cache_cb.value = False
+        self.replay_cache_cb.disabled = not self.use_cache_cb.value or self.is_running
+        self.update()
+
     # --- File/Dialog Handlers ---
     def create_template_click(self, e):
         def launch():
+            import TemplateCreator_flet  # Loads pywebview, so only when the creator is first opened
+
             TemplateCreator_flet.run_template_creator()
 
         threading.Thread(target=launch, daemon=True, name="MainThread").start()
@@ -1459,13 +612,24 @@ class ScraperApp(ft.Column):
             return
 
         try:
+            # The file is streamed by the scraper; only its URLs are counted here
             file_path = e.files[0].path
-            with open(file_path, 'r', encoding='utf-8') as f:
-                self.urls_field.value = f.read()
-            self.log(f"✅ URLs loaded from {os.path.basename(file_path)}")
+            url_count = UrlSource(path=file_path).count()
+            self.urls_file_path = file_path
+            self.urls_field.value = ""
+            self.urls_field.label = f"Using URLs from file: {os.path.basename(file_path)} ({url_count} URLs)"
+            self.clear_urls_file_button.visible = True
+            self.log(f"✅ {url_count} URLs will be read from {os.path.basename(file_path)}")
         except Exception as ex:
             self.log(f"❌ Error reading URL file: {ex}")
-        self.update()
+        self.show_view()
+
+    def clear_urls_file_click(self, e):
+        """Stops using the loaded URL file; URLs are taken from the text box again."""
+        self.urls_file_path = None
+        self.urls_field.label = URLS_FIELD_LABEL
+        self.clear_urls_file_button.visible = False
+        self.show_view()
 
     def open_playwright_script_editor(self, e):
         """Opens a modal dialog to edit the Playwright scrape script."""
@@ -2158,7 +1322,7 @@ class ScraperApp(ft.Column):
             self.current_step = 1;
             self.show_view()
             return
-        if not self.urls_field.value.strip():
+        if not self.urls_file_path and not self.urls_field.value.strip():
             self.log("❌ Please enter or load some URLs to scrape.")
             self.current_step = 2;
             self.show_view()
@@ -2186,7 +1350,7 @@ class ScraperApp(ft.Column):
         self._cancel_scraping = False
         self.current_step = 4
         self.show_view()
-        self.log_field.value = ""  # Clear previous logs
+        self.log_sink.clear()  # Clear previous logs
         self.log("🚀 Scraping process starting...")
         self.show_view()
 
@@ -2207,7 +1371,9 @@ class ScraperApp(ft.Column):
             output_name = self.output_name_field.value.strip() or "output"
             cookie_path = self.cookie_file_path
 
-            engine_map = {"Requests (faster)": "requests", "Playwright (customizable)": "playwright"}
+            engine_map = {"Requests (faster)": "requests", "Async (high concurrency)": "async",
+                          "Playwright (customizable)": "playwright",
+                          "Auto (Requests, Playwright when needed)": "auto"}
             engine_key = engine_map.get(self.engine_menu.value, "requests")
 
             mode_map = {
@@ -2217,11 +1383,17 @@ class ScraperApp(ft.Column):
             mode = mode_map.get(self.mode_menu.value)
 
             run_headless = self.headless_cb.value
+            if self.use_cache_cb.value and self.response_cache is None:
+                self.response_cache = ResponseCache(os.path.join(CACHE_DIR, "http"))
+            self.scraper.response_cache = self.response_cache if self.use_cache_cb.value else None
+            if self.scraper.response_cache:
+                self.scraper.response_cache.offline = bool(self.replay_cache_cb.value)
 
             # Run the scraper from the backend class
             result = self.scraper.run_scraper_from_content(
                 template_content=self.template_content,
                 urls_text=urls_text,
+                urls_file=self.urls_file_path,
                 output_name=output_name,
                 mode=mode,
                 progress_callback=self.log,
@@ -2231,8 +1403,9 @@ class ScraperApp(ft.Column):
                 headless=run_headless,
                 cookie_file_path=cookie_path,
                 # --- START: Pass main tag keys ---
-                main_tag_keys=self.selected_main_tag_keys
+                main_tag_keys=self.selected_main_tag_keys,
                 # --- END: Pass main tag keys ---
+                resume=bool(self.resume_cb.value)
             )
 
             # Process results
@@ -2292,7 +1465,10 @@ def main(page: ft.Page):
         )
     )
     page.update()
+    if IMPORT_TIMES is not None:
+        print(import_report("First window shown"), file=sys.stderr)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Extraction worker processes of the frozen EXE start here
     ft.app(target=main)
\ No newline at end of file
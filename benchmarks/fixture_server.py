@@ -0,0 +1,223 @@
+"""
+Local fixture HTTP server for the Scrapuj benchmarks (standard library only).
+
+Serves a generated corpus of product pages, in a static HTML and a JavaScript-rendered variant,
+or the .html files of a folder of saved pages. Latency and errors can be injected per request.
+
+    python benchmarks/fixture_server.py --port 8900 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import html
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROBOTS_TXT = b"User-agent: *\nAllow: /\n"
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore "
+         "et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip "
+         "zażółć gęślą jaźń").split()
+
+# Template matching the generated pages (both variants render the same fields)
+TEMPLATE = {
+    "selectors": {
+        "title": "h1.title",
+        "body": "article.body",
+        "body_excluded": "div.ad",
+        "upc": "//th[normalize-space()='UPC']/following-sibling::td[1]",
+        "price": "//th[normalize-space()='Price']/following-sibling::td[1]",
+        "links": "ul.links",
+    }
+}
+
+# The JS variant ships its data as JSON and builds the same DOM as the static variant in the browser
+JS_APP = """
+document.addEventListener("DOMContentLoaded", function () {
+  var d = JSON.parse(document.getElementById("data").textContent);
+  var app = document.getElementById("app");
+  var h = "<h1 class='title'>" + d.title + "</h1><article class='body'>";
+  d.paragraphs.forEach(function (p) { h += "<p>" + p + "</p>"; });
+  h += "<div class='ad'>Advert</div></article><table class='info'><tr><th>UPC</th><td>" + d.upc +
+       "</td></tr><tr><th>Price</th><td>" + d.price + "</td></tr></table><ul class='links'>";
+  d.related.forEach(function (r) { h += "<li><a href='" + r + "'>" + r + "</a></li>"; });
+  app.innerHTML = h + "</ul>";
+});
+"""
+
+
+def _page_data(i, count, paragraphs, rng):
+    return {
+        "title": f"Product {i}",
+        "paragraphs": [" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90))) for _ in range(paragraphs)],
+        "upc": f"{rng.getrandbits(48):012x}",
+        "price": f"£{rng.uniform(5, 500):.2f}",
+        "related": [f"{j % count}.html" for j in range(i + 1, i + 11)],
+    }
+
+
+def static_page(data):
+    menu = "".join(f"<li><a href='/category/{n}'>Category {n}</a></li>" for n in range(20))
+    paragraphs = "".join(f"<p>{html.escape(p)}</p>" for p in data["paragraphs"])
+    related = "".join(f"<li><a href='{r}'>{r}</a></li>" for r in data["related"])
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{data['title']}</title>"
+            f"<style>body {{ font-family: sans-serif; }}</style>"
+            f"<script>var analytics = {{page: '{data['title']}'}};</script></head><body>"
+            f"<nav><ul class='menu'>{menu}</ul></nav>"
+            f"<h1 class='title'>{data['title']}</h1>"
+            f"<article class='body'>{paragraphs}<div class='ad'>Advert <a href='/ad'>buy</a></div></article>"
+            f"<table class='info'><tr><th>UPC</th><td>{data['upc']}</td></tr>"
+            f"<tr><th>Price</th><td>{data['price']}</td></tr></table>"
+            f"<ul class='links'>{related}</ul>"
+            f"<footer><p>Fixture page served by the Scrapuj benchmark server.</p></footer>"
+            f"</body></html>").encode("utf-8")
+
+
+def js_page(data):
+    payload = json.dumps(data, ensure_ascii=False).replace("</", "<\\/")
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{data['title']}</title>"
+            f"<script id='data' type='application/json'>{payload}</script>"
+            f"<script>{JS_APP}</script></head><body><div id='app'></div>"
+            f"<noscript>Please enable JavaScript to view this page.</noscript>"
+            f"</body></html>").encode("utf-8")
+
+
+def build_corpus(count=200, paragraphs=8, seed=1):
+    """Generated pages: /static/<i>.html and /js/<i>.html carry the same data (see TEMPLATE)."""
+    rng = random.Random(seed)
+    pages = {"/robots.txt": ROBOTS_TXT}
+    for i in range(count):
+        data = _page_data(i, count, paragraphs, rng)
+        pages[f"/static/{i}.html"] = static_page(data)
+        pages[f"/js/{i}.html"] = js_page(data)
+    return pages
+
+
+def load_corpus(folder):
+    """Saved pages: every .html file under `folder`, served as /saved/<relative path>."""
+    pages = {"/robots.txt": ROBOTS_TXT}
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith((".html", ".htm")):
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, folder).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    pages["/saved/" + rel] = f.read()
+    return pages
+
+
+class FixtureServer:
+    """
+    Serves `pages` (path -> bytes) on 127.0.0.1 from a background thread.
+    latency/jitter: seconds added before every response (latency + uniform(0, jitter)).
+    error_rate: share of page requests answered with `error_status` instead of the page.
+    """
+
+    def __init__(self, pages, port=0, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=1):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def _decide(self, path):
+        """Returns (delay, inject_error) for one request."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            inject = path != "/robots.txt" and self.error_rate > 0 and self._rng.random() < self.error_rate
+            if inject:
+                self.errors += 1
+        return delay, inject
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                delay, inject = server._decide(path)
+                if delay > 0:
+                    time.sleep(delay)
+                body = server.pages.get(path)
+                if inject or body is None:
+                    status = server.error_status if inject else 404
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    if status in (429, 503):
+                        self.send_header("Retry-After", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                content_type = "text/plain" if path.endswith(".txt") else "text/html; charset=utf-8"
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep benchmark output clean
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="FixtureServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Scrapuj benchmark corpus.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--pages", type=int, default=200, help="number of generated pages per variant")
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per generated page (page size)")
+    parser.add_argument("--corpus", help="serve the .html files of this folder instead of generated pages")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else build_corpus(args.pages, args.paragraphs)
+    server = FixtureServer(pages, port=args.port, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, error_status=args.error_status)
+    print(f"Serving {len(pages) - 1} pages on http://127.0.0.1:{server.port}/ (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Offline benchmarks for Scrapuj: runs Scraper.run_scraper against the local fixture server
+(benchmarks/fixture_server.py) for every engine x output mode and reports pages/s, CPU time,
+peak RSS and output-write time. No real website is contacted.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --engines requests,async --modes text_only --pages 500 --latency 0.02
+    python benchmarks/run_benchmarks.py --save before.json      # ...change code...
+    python benchmarks/run_benchmarks.py --compare before.json
+
+Every case runs in its own Python process, so CPU time and peak RSS are not mixed between cases.
+CPU time covers the main Python process only (not the Playwright browser or extraction worker processes).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fixture_server import FixtureServer, TEMPLATE, build_corpus, load_corpus
+
+ENGINES = ("requests", "async", "playwright", "auto")
+MODES = ("text_only", "urls_only", "text_metadata")
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read."""
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # bytes on macOS, KB elsewhere
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def run_case(engine, mode, urls_file, template_file, workers, per_host_limit=None, extraction_processes=0,
+             parser_backend="bs4", output_dir=None):
+    """
+    Runs one scrape in this process and returns its measurements.
+    Its files go to output_dir (default: a temporary folder removed afterwards), never to output/.
+    """
+    if output_dir is None:
+        with tempfile.TemporaryDirectory(prefix="scrapuj_bench_") as output_dir:
+            return run_case(engine, mode, urls_file, template_file, workers, per_host_limit, extraction_processes,
+                            parser_backend, output_dir)
+    sys.path.insert(0, REPO_DIR)
+    import scrapuj_core
+
+    options = {"per_host_limit": per_host_limit} if per_host_limit else {}
+    scraper = scrapuj_core.Scraper(rotate_user_agent=False, min_delay=0.0, max_delay=0.0, workers=workers,
+                                   browser_pages=4, extraction_processes=extraction_processes,
+                                   parser_backend=parser_backend, **options)
+    with open(template_file, encoding="utf-8") as f:
+        template_content = f.read()
+    logs = []
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    result = scraper.run_scraper_from_content(template_content, "", "bench", mode=mode, engine=engine,
+                                              progress_callback=logs.append, urls_file=urls_file,
+                                              main_tag_keys=["title"], output_dir=output_dir)
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    report = {}
+    if result.get("perf_file") and os.path.exists(result["perf_file"]):
+        with open(result["perf_file"], encoding="utf-8") as f:
+            report = json.load(f)
+    stages = report.get("stages", {})
+    urls = report.get("urls", 0)
+    failed = sum(1 for line in logs if line.startswith("❌ [") and " error: " in line)
+    return {
+        "engine": engine,
+        "mode": mode,
+        "status": result.get("status"),
+        "urls": urls,
+        "failed": failed,
+        "wall_s": round(wall, 3),
+        "pages_per_s": round(urls / wall, 2) if wall > 0 else 0.0,
+        "cpu_s": round(cpu, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "write_s": round(sum(stages.get(stage, {}).get("total_s", 0.0) for stage in ("save", "finalize")), 4),
+        "parse_s": round(stages.get("parse", {}).get("total_s", 0.0), 4),
+        "extract_s": round(sum(stages.get(stage, {}).get("total_s", 0.0) for stage in ("selectors", "clean_text")), 4),
+        "fetch_p95_ms": round(stages.get("fetch", stages.get("navigate", {})).get("p95_s", 0.0) * 1000, 2),
+    }
+
+
+def run_case_in_subprocess(engine, mode, urls_file, template_file, workers, output_dir, per_host_limit=None,
+                           extraction_processes=0, parser_backend="bs4"):
+    os.makedirs(output_dir, exist_ok=True)
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-case", engine, mode,
+           "--urls-file", urls_file, "--template", template_file, "--workers", str(workers),
+           "--extraction-processes", str(extraction_processes), "--parser", parser_backend,
+           "--output-dir", output_dir]
+    if per_host_limit:
+        cmd += ["--per-host-limit", str(per_host_limit)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return {"engine": engine, "mode": mode, "status": "crashed", "stderr": proc.stderr.strip()[-500:]}
+
+
+def case_urls(args, servers):
+    """URL list for the chosen page variant."""
+    static_server, js_server = servers
+    if args.corpus:
+        return [static_server.url(path) for path in static_server.pages if path != "/robots.txt"]
+    static = [static_server.url(f"/static/{i}.html") for i in range(args.pages)]
+    js = [js_server.url(f"/js/{i}.html") for i in range(args.pages)]
+    if args.variant == "static":
+        return static
+    if args.variant == "js":
+        return js
+    # "mixed": every other URL is JS-rendered, each variant on its own host (port)
+    return [url for pair in zip(static, js) for url in pair][:args.pages]
+
+
+def print_table(results, baseline=None):
+    columns = ("engine", "mode", "urls", "failed", "pages_per_s", "cpu_s", "peak_rss_mb", "write_s",
+               "parse_s", "extract_s", "fetch_p95_ms")
+    base = {(r["engine"], r["mode"]): r for r in (baseline or [])}
+    print("  ".join(f"{c:>13}" for c in columns))
+    for r in results:
+        cells = []
+        for c in columns:
+            value = r.get(c, "-")
+            old = base.get((r["engine"], r["mode"]), {}).get(c)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old and c not in ("urls", "failed"):
+                value = f"{value}({(value - old) / old * 100:+.0f}%)"
+            cells.append(f"{str(value if value is not None else '-'):>13}")
+        print("  ".join(cells))
+        if r.get("status") != "ok":
+            print(f"    ↳ {r.get('status')}: {r.get('stderr', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrapuj offline benchmarks.")
+    parser.add_argument("--engines", default="requests,async,auto",
+                        help=f"comma separated, from {', '.join(ENGINES)}")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma separated, from {', '.join(MODES)}")
+    parser.add_argument("--variant", choices=("static", "js", "mixed"), default="static")
+    parser.add_argument("--pages", type=int, default=200, help="URLs per case")
+    parser.add_argument("--paragraphs", type=int, default=8, help="paragraphs per generated page (page size)")
+    parser.add_argument("--corpus", help="benchmark the .html files of this folder instead of generated pages")
+    parser.add_argument("--template", help="template JSON (default: the one matching the generated pages)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-host-limit", type=int,
+                        help="connections per host (default: the Scraper default; the fixture is a single host)")
+    parser.add_argument("--extraction-processes", type=int, default=0,
+                        help="parse and extract in this many worker processes (0: in the fetch threads)")
+    parser.add_argument("--parser", choices=("bs4", "lxml"), default="bs4", help="extraction backend")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="show the change against results saved with --save")
+    parser.add_argument("--run-case", nargs=2, metavar=("ENGINE", "MODE"), help=argparse.SUPPRESS)
+    parser.add_argument("--urls-file", help=argparse.SUPPRESS)
+    parser.add_argument("--output-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(*args.run_case, args.urls_file, args.template, args.workers,
+                                  args.per_host_limit, args.extraction_processes, args.parser,
+                                  args.output_dir)))
+        return
+
+    pages = load_corpus(args.corpus) if args.corpus else build_corpus(args.pages, args.paragraphs)
+    server_args = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       error_status=args.error_status)
+    with tempfile.TemporaryDirectory(prefix="scrapuj_bench_") as work_dir, \
+            FixtureServer(pages, **server_args) as static_server, \
+            FixtureServer(pages, seed=2, **server_args) as js_server:
+        template_file = args.template
+        if not template_file:
+            template_file = os.path.join(work_dir, "template.json")
+            with open(template_file, "w", encoding="utf-8") as f:
+                json.dump(TEMPLATE, f)
+        urls_file = os.path.join(work_dir, "urls.txt")
+        with open(urls_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(case_urls(args, (static_server, js_server))))
+
+        results = []
+        for engine in args.engines.split(","):
+            for mode in args.modes.split(","):
+                print(f"… {engine} / {mode}", file=sys.stderr)
+                # Case output lives in the work folder, which is removed with everything in it
+                output_dir = os.path.join(work_dir, f"{engine}_{mode}")
+                results.append(run_case_in_subprocess(engine, mode, urls_file, template_file, args.workers,
+                                                      output_dir, args.per_host_limit,
+                                                      args.extraction_processes, args.parser))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            hidden = ("save", "compare", "run_case", "urls_file", "output_dir")
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k not in hidden},
+                       "results": results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
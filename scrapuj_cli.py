@@ -0,0 +1,152 @@
+"""
+Scrapuj command line: runs a template over a URL list without the Flet GUI (no display needed).
+Only the backend (scrapuj_core) is loaded, so it suits servers and scheduled jobs.
+
+    python scrapuj_cli.py run --template templates/books.json --urls urls.txt
+    python -m scrapuj_cli run --template t.json --urls urls.txt --engine async --workers 32 --output books
+    python scrapuj_cli.py run --template t.json --urls urls.txt --mode text_metadata --main-tags title,description
+
+Ctrl+C (or SIGTERM) stops the run after the URLs in progress and keeps the partial output;
+run the same command again with --resume to continue it.
+"""
+import argparse
+import os
+import signal
+import sys
+
+ENGINES = ("requests", "async", "playwright", "auto")
+MODES = ("text_only", "urls_only", "text_metadata")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="scrapuj_cli", description="Run Scrapuj templates without the GUI.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="scrape a URL list with a template")
+    run.add_argument("--template", required=True, help="template JSON file")
+    run.add_argument("--urls", required=True, help="text file with one URL per line ('-' reads standard input)")
+    run.add_argument("--output", help="output name (default: the template file name)")
+    run.add_argument("--output-dir", help="folder for the output files (default: output/ next to Scrapuj)")
+    run.add_argument("--engine", choices=ENGINES, default="requests")
+    run.add_argument("--mode", choices=MODES, default="text_only")
+    run.add_argument("--main-tags", help="text_metadata mode: comma separated fields merged into the .txt files")
+    run.add_argument("--output-format", choices=("json", "jsonl"), default="json")
+    run.add_argument("--resume", action="store_true", help="continue the unfinished run with this output name")
+
+    network = run.add_argument_group("network")
+    network.add_argument("--workers", type=int, default=8, help="concurrent fetch workers (requests, auto)")
+    network.add_argument("--async-concurrency", type=int, default=500, help="in-flight fetches (async)")
+    network.add_argument("--per-host-limit", type=int, default=4, help="simultaneous connections to one host")
+    network.add_argument("--min-delay", type=float, default=1.0, help="shortest pause between requests to a host")
+    network.add_argument("--max-delay", type=float, default=3.0, help="longest pause between requests to a host")
+    network.add_argument("--retries", type=int, default=3)
+    network.add_argument("--timeout", type=float, default=15, help="per-request timeout (seconds)")
+    network.add_argument("--no-rotate-user-agent", action="store_true")
+    network.add_argument("--cache", action="store_true",
+                         help="keep pages in the on-disk response cache (cache/http) and revalidate them on re-runs")
+    network.add_argument("--replay", action="store_true",
+                         help="serve pages from the response cache only (needs --cache)")
+
+    extraction = run.add_argument_group("extraction")
+    extraction.add_argument("--extraction-processes", type=int, default=0,
+                            help="parse and extract in this many worker processes (0: in the fetch threads)")
+    extraction.add_argument("--parser", choices=("bs4", "lxml"), default="bs4",
+                            help="lxml is faster, but may read malformed HTML (unclosed tags) differently")
+
+    browser = run.add_argument_group("browser (playwright, auto)")
+    browser.add_argument("--browser-pages", type=int, default=4, help="pages driven in parallel")
+    browser.add_argument("--headed", action="store_true", help="show the browser window")
+    browser.add_argument("--cookies", help="saved login session (cookies JSON)")
+    browser.add_argument("--script", help="Playwright script file run on every page")
+    browser.add_argument("--browser-extraction", action="store_true",
+                         help="extract inside the page (faster; XPath hits lose the text that follows them)")
+
+    run.add_argument("--quiet", action="store_true", help="print only errors, warnings and the summary")
+    return parser
+
+
+def run_command(args):
+    # Imported here so that --help and argument errors do not load the backend
+    from scrapuj_core import CACHE_DIR, Scraper
+
+    try:
+        with open(args.template, encoding="utf-8") as f:
+            template_content = f.read()
+    except OSError as e:
+        print(f"❌ Cannot read template: {e!r}", file=sys.stderr)
+        return 1
+    scrape_script = None
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            scrape_script = f.read()
+    main_tag_keys = [tag.strip() for tag in (args.main_tags or "").split(",") if tag.strip()] or None
+
+    scraper = Scraper(rotate_user_agent=not args.no_rotate_user_agent, min_delay=args.min_delay,
+                      max_delay=args.max_delay, retry_total=args.retries, workers=args.workers,
+                      async_concurrency=args.async_concurrency, per_host_limit=args.per_host_limit,
+                      timeout=args.timeout, robots_cache_file=os.path.join(CACHE_DIR, "robots_cache.json"),
+                      parser_backend=args.parser, output_format=args.output_format,
+                      browser_pages=args.browser_pages, browser_extraction=args.browser_extraction,
+                      response_cache_dir=os.path.join(CACHE_DIR, "http") if args.cache else None,
+                      replay_from_cache=args.replay, extraction_processes=args.extraction_processes)
+
+    cancelled = []
+
+    def cancel(signum, frame):
+        if cancelled:
+            raise KeyboardInterrupt  # Second Ctrl+C: stop at once
+        cancelled.append(signum)
+        print("⚠️ Stopping after the URLs in progress (press Ctrl+C again to abort)...", file=sys.stderr)
+
+    signal.signal(signal.SIGINT, cancel)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, cancel)
+
+    def log(message):
+        if args.quiet and not message.startswith(("❌", "⚠️", "💥", "⏱️")):
+            return
+        print(message, flush=True)
+
+    result = scraper.run_scraper_from_content(
+        template_content=template_content,
+        urls_text=sys.stdin if args.urls == "-" else None,
+        urls_file=None if args.urls == "-" else args.urls,
+        output_name=args.output or os.path.splitext(os.path.basename(args.template))[0],
+        mode=args.mode,
+        progress_callback=log,
+        cancel_flag=lambda: bool(cancelled),
+        engine=args.engine,
+        scrape_script=scrape_script,
+        headless=not args.headed,
+        cookie_file_path=args.cookies,
+        main_tag_keys=main_tag_keys,
+        resume=args.resume,
+        output_dir=os.path.abspath(args.output_dir) if args.output_dir else None,
+    )
+
+    if result["status"] != "ok":
+        print(f"❌ Error: {result.get('message', 'Unknown error')}", file=sys.stderr)
+        return 1
+    if cancelled:
+        print(f"⏹️ Scraping stopped. Partial output saved to {result['filename']}")
+        return 130
+    print(f"✅ Scraping finished! Output saved to {result['filename']}")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.mode == "text_metadata" and not args.main_tags:
+        parser.error("--mode text_metadata needs --main-tags (the fields merged into the .txt files)")
+    if args.replay and not args.cache:
+        parser.error("--replay serves pages from the response cache; add --cache")
+    try:
+        return run_command(args)
+    except KeyboardInterrupt:
+        print("⏹️ Aborted.", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3426 @@
+"""
+Scrapuj backend: fetching engines, template extraction and output writers, without the Flet GUI.
+Used by the desktop app (Scrapuj.py) and the command line (scrapuj_cli.py).
+Set SCRAPUJ_IMPORT_TIMES=1 to print what every import costs at startup.
+"""
+import builtins
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+# ----------------------------
+# Startup Profiling and Lazy Imports
+# ----------------------------
+STARTED = time.perf_counter()
+IMPORT_TIMES = {} if os.environ.get("SCRAPUJ_IMPORT_TIMES") else None  # module -> seconds, when profiling
+_OWN_MODULES = frozenset(["scrapuj_core", "Scrapuj", "scrapuj_cli", "TemplateCreator_flet", "__main__", "__mp_main__"])
+
+
+def _install_import_timer():
+    """Times every first import made by Scrapuj's own modules (library-internal imports count towards them)."""
+    original_import = builtins.__import__
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or (globals or {}).get("__name__") not in _OWN_MODULES:
+            return original_import(name, globals, locals, fromlist, level)
+        started = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            IMPORT_TIMES[name] = IMPORT_TIMES.get(name, 0.0) + time.perf_counter() - started
+
+    builtins.__import__ = timed_import
+
+
+def import_report(title):
+    """Startup summary for SCRAPUJ_IMPORT_TIMES=1: time since scrapuj_core started loading, slowest imports first."""
+    lines = [f"⏱️ {title} after {(time.perf_counter() - STARTED) * 1000:.0f} ms. Imports:"]
+    for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: item[1], reverse=True):
+        if seconds >= 0.001:
+            lines.append(f"    {seconds * 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
+
+
+def lazy_import(name):
+    """Imports an optional or heavy dependency on first use (its cost is printed with SCRAPUJ_IMPORT_TIMES=1)."""
+    if IMPORT_TIMES is None or name in sys.modules:
+        # import_module, not a sys.modules lookup: while another thread is still importing the module
+        # it is already in sys.modules half-initialized, and import_module waits for it to finish.
+        return importlib.import_module(name)
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    seconds = time.perf_counter() - started
+    IMPORT_TIMES[name] = seconds
+    print(f"⏱️ lazy import {name}: {seconds * 1000:.1f} ms", file=sys.stderr)
+    return module
+
+
+class LazyModule:
+    """Stands in for a module that is imported on first attribute access (see lazy_import)."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = lazy_import(self._name)
+        return getattr(self._module, attr)
+
+
+def sync_playwright():
+    """playwright.sync_api.sync_playwright(); Playwright is imported on first use."""
+    return lazy_import("playwright.sync_api").sync_playwright()
+
+
+if IMPORT_TIMES is not None:
+    _install_import_timer()
+
+import json
+import requests
+import tempfile
+import random
+import logging
+from urllib.robotparser import RobotFileParser
+from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+from urllib3 import PoolManager, HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.exceptions import ConnectTimeoutError
+import threading
+import queue
+from collections import deque, OrderedDict
+import hashlib
+import io
+import math
+import datetime
+import email.utils
+import contextlib
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import shared_memory
+import socket
+import re
+import asyncio
+
+LXML_AVAILABLE = True
+# Optional CSS -> XPath compiler for the lxml extraction backend (lxml.cssselect, loaded with the first template)
+CSSSELECT_AVAILABLE = importlib.util.find_spec("cssselect") is not None
+# Heavy dependencies are imported on first use: lxml and soupsieve (the first page or template), BeautifulSoup
+# (bs4 backend), openpyxl (metadata XLSX), the optional Playwright fallback (see sync_playwright) and the
+# optional asyncio HTTP client ('async' engine). No run exists before the GUI window is shown, so none of them
+# is needed to get there.
+# PyInstaller cannot see imports made through lazy_import(): a frozen build names them with --hidden-import.
+LAZY_MODULES = ("lxml.html", "lxml.etree", "lxml.cssselect", "soupsieve", "bs4", "openpyxl",
+                "playwright.sync_api", "aiohttp")
+html = LazyModule("lxml.html")
+etree = LazyModule("lxml.etree")
+soupsieve = LazyModule("soupsieve")
+bs4 = LazyModule("bs4")
+aiohttp = LazyModule("aiohttp")
+PLAYWRIGHT_AVAILABLE = importlib.util.find_spec("playwright") is not None
+AIOHTTP_AVAILABLE = importlib.util.find_spec("aiohttp") is not None
+
+# ----------------------------
+# PyInstaller-Safe Path Setup
+# ----------------------------
+def get_base_path():
+    """Get the reliable base path, whether running as a script or PyInstaller exe."""
+    if getattr(sys, 'frozen', False):
+        # Running as a PyInstaller executable
+        return os.path.dirname(os.path.abspath(sys.executable))
+    else:
+        # Running as a normal Python script
+        return os.path.dirname(os.path.abspath(__file__))
+
+BASE_PATH = get_base_path()
+TEMPLATE_DIR = os.path.join(BASE_PATH, "templates")
+COOKIE_DIR = os.path.join(BASE_PATH, "cookies")
+OUTPUT_DIR = os.path.join(BASE_PATH, "output")
+CACHE_DIR = os.path.join(BASE_PATH, "cache")
+LOG_DIR = os.path.join(BASE_PATH, "logs")
+
+# --- Create directories if they don't exist ---
+for path in [TEMPLATE_DIR, COOKIE_DIR, OUTPUT_DIR, CACHE_DIR, LOG_DIR]:
+    os.makedirs(path, exist_ok=True)
+
+# ----------------------------
+# Configuration / Defaults
+# ----------------------------
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/119.0.0.0 Safari/537.36"
+)
+
+# A small sample list of user-agents for rotation (expand if desired)
+USER_AGENTS = [
+    DEFAULT_USER_AGENT,
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.4 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+]
+
+# Tags whose text BeautifulSoup's get_text() leaves out; the lxml backend skips them the same way.
+NON_TEXT_TAGS = frozenset(["script", "style", "template", "rt", "rp"])
+
+# In-page extraction for the Playwright engine, run with ONE page.evaluate() call per scrape.
+# Mirrors _extract_with_lxml on a detached copy of the DOM (so exclusions never touch the live page)
+# and returns only the raw text (or hrefs) of the matched elements; a null entry means "no match".
+# Line cleaning and urljoin stay in Python. Returns null if the browser cannot run a selector.
+BROWSER_EXTRACT_JS = r"""
+(spec) => {
+    const skip = new Set(spec.skip);
+    const doc = document.implementation.createHTMLDocument("");
+    doc.replaceChild(doc.importNode(document.documentElement, true), doc.documentElement);
+
+    const select = (sel) => {
+        if (sel.kind === "css") {
+            return Array.from(doc.querySelectorAll(sel.selector));
+        }
+        if (sel.kind === "xpath") {
+            const found = doc.evaluate(sel.selector, doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            const els = [];
+            for (let i = 0; i < found.snapshotLength; i++) {
+                const node = found.snapshotItem(i);
+                if (node.nodeType === Node.ELEMENT_NODE) els.push(node);
+            }
+            return els;
+        }
+        return [];
+    };
+
+    const textOf = (el) => {
+        const parts = [];
+        const stack = [el];
+        while (stack.length) {
+            const node = stack.pop();
+            if (node.nodeType === Node.TEXT_NODE) {
+                parts.push(node.data);
+                continue;
+            }
+            if (node.nodeType !== Node.ELEMENT_NODE) continue;  // Comments etc.
+            if (node !== el) {
+                const tag = node.localName;
+                if (tag === "br") parts.push("\n");
+                else if (tag === "p") parts.push("\n\n");
+                if (skip.has(tag)) continue;
+            }
+            for (let child = node.lastChild; child; child = child.previousSibling) stack.push(child);
+        }
+        return parts.join("");
+    };
+
+    const hrefsOf = (els) => {
+        const hrefs = [];
+        for (const el of els) {
+            if (el.localName === "a" && el.getAttribute("href")) hrefs.push(el.getAttribute("href"));
+            for (const a of el.querySelectorAll("a[href]")) hrefs.push(a.getAttribute("href"));
+        }
+        return hrefs;
+    };
+
+    try {
+        for (const sel of spec.excluded) {
+            for (const el of doc.querySelectorAll(sel)) el.remove();
+        }
+        return spec.main.map((sel) => {
+            const els = select(sel);
+            if (!els.length) return null;
+            return spec.links ? hrefsOf(els) : els.map(textOf);
+        });
+    } catch (e) {
+        return null;
+    }
+}
+"""
+
+# <noscript> notices of pages that render their content with JavaScript (engine="auto" escalates them)
+JS_REQUIRED_PATTERNS = re.compile(
+    rb"<noscript[^>]*>[^<]*(?:enable|turn on|requires?)[^<]*javascript",
+    re.IGNORECASE
+)
+
+CAPTCHA_PATTERNS = re.compile(
+    r"captcha|recaptcha|prove you are human|verify you are human|are you human",
+    flags=re.IGNORECASE,
+)
+
+# Configure logging if you want to also write to a file (optional)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+
+
+# ----------------------------
+# Run Helpers (Backend)
+# ----------------------------
+class HostThrottle:
+    """
+    Adaptive politeness limiter, one token bucket (holding a single token) per host.
+    Every request books the host's next free slot, so workers hitting different hosts never wait
+    on each other. The gap between slots adapts to how the host responds (see feedback()):
+    healthy responses shrink it step by step down to min_delay, while 429/503 responses double it
+    and Retry-After pushes the next slot out. It never drops below the robots.txt Crawl-delay.
+    """
+
+    SPEED_UP = 0.9  # Gap multiplier after a healthy response
+    SLOW_DOWN = 2.0  # Gap multiplier after a 429/503
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, min_delay, max_delay, max_backoff=60.0, max_retry_after=600.0):
+        self.min_delay = min_delay
+        self.max_delay = max(max_delay, min_delay)
+        self.max_backoff = max(max_backoff, self.max_delay)
+        self.max_retry_after = max_retry_after
+        # Jitter keeps the original uniform(min_delay, max_delay) spread at the starting gap
+        self._jitter_floor = self.min_delay / self.max_delay if self.max_delay > 0 else 1.0
+        self._next_slot = {}
+        self._interval = {}  # host -> current gap (starts at max_delay)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url):
+        return urlparse(url).netloc.lower()
+
+    def reserve(self, url, min_interval=0.0):
+        """
+        Books a slot for the URL's host and returns how many seconds to wait for it.
+        min_interval: lower bound for the gap to the next request (e.g. robots.txt Crawl-delay).
+        """
+        host = self._host(url)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            interval = self._interval.get(host, self.max_delay)
+            gap = max(self.min_delay, interval * random.uniform(self._jitter_floor, 1.0), min_interval or 0.0)
+            self._next_slot[host] = slot + gap
+        return slot - now
+
+    def wait(self, url, min_interval=0.0):
+        delay = self.reserve(url, min_interval)
+        if delay > 0:
+            time.sleep(delay)
+
+    def feedback(self, url, status, retry_after=None):
+        """
+        Adapts the host's gap to a response: status is the HTTP status (None for a network error,
+        which leaves the gap unchanged); retry_after is the raw Retry-After header, if any.
+        Returns the host's new gap in seconds.
+        """
+        host = self._host(url)
+        with self._lock:
+            interval = self._interval.get(host, self.max_delay)
+            if status in self.THROTTLE_STATUSES:
+                interval = min(self.max_backoff, max(interval * self.SLOW_DOWN, self.max_delay, 1.0))
+                wait = self.parse_retry_after(retry_after)
+                if wait is not None:
+                    wait = min(wait, self.max_retry_after)
+                    interval = min(self.max_backoff, max(interval, wait))
+                    now = time.monotonic()
+                    self._next_slot[host] = max(self._next_slot.get(host, now), now + wait)
+            elif status is not None and status < 500:
+                interval = max(self.min_delay, interval * self.SPEED_UP)
+            self._interval[host] = interval
+        return interval
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Retry-After as seconds (it may be a number of seconds or an HTTP date); None if absent/invalid."""
+        if not value:
+            return None
+        value = str(value).strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when is None:
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    The one retry layer shared by every engine (urllib3 does not retry on its own).
+    Errors are classified, then retried with jittered exponential backoff until `max_retries` retries
+    or the per-URL time `budget` are used up. DNS failures and 4xx answers fail fast (a dead link costs
+    one request), 429/503 are retried once the HostThrottle's backed-off slot comes up, connect/read
+    errors, 5xx and empty pages back off.
+    """
+
+    FAST_FAIL = ("dns", "client")
+    DNS_MARKERS = ("NameResolutionError", "Name or service not known", "nodename nor servname",
+                   "getaddrinfo failed", "Temporary failure in name resolution", "No address associated",
+                   "ERR_NAME_NOT_RESOLVED")
+    READ_MARKERS = ("ReadTimeout", "Read timed out", "ServerTimeoutError", "ServerDisconnectedError",
+                    "ClientPayloadError", "ChunkedEncodingError", "IncompleteRead", "Connection reset",
+                    "ERR_CONNECTION_RESET", "ERR_TIMED_OUT", "Timeout")
+    CONNECT_MARKERS = ("NewConnectionError", "ConnectTimeout", "ClientConnectorError", "Connection refused",
+                       "ERR_CONNECTION_REFUSED", "ERR_CONNECTION_CLOSED", "ERR_ADDRESS_UNREACHABLE")
+
+    def __init__(self, max_retries=3, budget=60.0, backoff_base=1.0, backoff_max=20.0):
+        self.max_retries = max(0, int(max_retries))
+        self.budget = budget
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    @staticmethod
+    def status_of(error):
+        """HTTP status carried by a requests/aiohttp error, if any."""
+        response = getattr(error, "response", None)
+        if response is not None and getattr(response, "status_code", None) is not None:
+            return response.status_code
+        status = getattr(error, "status", None)
+        return status if isinstance(status, int) else None
+
+    @classmethod
+    def classify(cls, error, status=None):
+        """
+        Returns the error kind: "dns", "client" (4xx), "throttled" (429/503), "server" (other 5xx),
+        "connect", "read" or "other". Works on requests, aiohttp and Playwright errors (and their causes).
+        """
+        status = status if status is not None else cls.status_of(error)
+        if status is not None:
+            if status in HostThrottle.THROTTLE_STATUSES:
+                return "throttled"
+            if status in (408, 425):  # Request Timeout / Too Early: worth another try
+                return "read"
+            return "client" if status < 500 else "server"
+        chain = []
+        seen = set()
+        todo = [error]
+        while todo:
+            e = todo.pop()
+            if not isinstance(e, BaseException) or id(e) in seen:
+                continue
+            seen.add(id(e))
+            chain.append(e)
+            todo.extend([e.__cause__, e.__context__, getattr(e, "reason", None), getattr(e, "os_error", None)])
+            todo.extend(arg for arg in e.args if isinstance(arg, BaseException))
+        if any(isinstance(e, socket.gaierror) for e in chain):
+            return "dns"
+        text = " ".join(f"{type(e).__name__}: {e}" for e in chain)
+        if any(marker in text for marker in cls.DNS_MARKERS):
+            return "dns"
+        if any(marker in text for marker in cls.CONNECT_MARKERS):
+            return "connect"
+        if any(isinstance(e, (TimeoutError, asyncio.TimeoutError)) for e in chain) or \
+                any(marker in text for marker in cls.READ_MARKERS):
+            return "read"
+        if any(isinstance(e, (ConnectionError, requests.exceptions.ConnectionError)) for e in chain):
+            return "connect"
+        return "other"
+
+    def start(self):
+        """Retry bookkeeping for one URL (its budget starts with the first attempt)."""
+        return RetryAttempts(self)
+
+
+class RetryAttempts:
+    """Attempts of one URL under a RetryPolicy."""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempt = 0
+        self.deadline = None
+
+    def begin(self):
+        """
+        Call once the host's slot is acquired, right before each attempt; returns its number (1-based).
+        The budget starts at the first attempt, so the first politeness wait is not charged to the URL.
+        """
+        self.attempt += 1
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.policy.budget
+        return self.attempt
+
+    def next_delay(self, kind, retry_after=None):
+        """
+        Seconds to sleep before retrying after an error of `kind`, or None to give up.
+        "throttled" needs no sleep of its own (the HostThrottle holds the host back) unless
+        the server's Retry-After already runs past the budget, which gives up at once.
+        """
+        policy = self.policy
+        if kind in policy.FAST_FAIL or self.attempt > policy.max_retries:
+            return None
+        remaining = self.deadline - time.monotonic()
+        if kind == "throttled":
+            wait = HostThrottle.parse_retry_after(retry_after) or 0.0
+            return 0.0 if wait < remaining else None
+        cap = min(policy.backoff_max, policy.backoff_base * 2 ** (self.attempt - 1))
+        delay = cap / 2 + random.uniform(0, cap / 2)  # "Equal jitter" exponential backoff
+        return delay if delay < remaining else None
+
+
+class EngineRouter:
+    """
+    Per-host engine choice for engine="auto". Every host starts on the fast requests path and is
+    escalated to Playwright page by page; once `learn_after` pages of a host have shown which engine
+    works, later URLs of that host go straight to it (and static hosts stop being escalated at all).
+    """
+
+    def __init__(self, learn_after=3):
+        self.learn_after = learn_after
+        self._counts = {}  # host -> [pages fine with requests, pages that needed the browser]
+        self._pinned = {}  # host -> "requests" | "playwright"
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url):
+        return urlparse(url).netloc.lower()
+
+    def choose(self, url):
+        return self._pinned.get(self._host(url), "requests")
+
+    def may_escalate(self, url):
+        return self._pinned.get(self._host(url)) != "requests"
+
+    def record(self, url, engine):
+        """Records which engine delivered the page; returns the engine the host was just pinned to, if any."""
+        host = self._host(url)
+        with self._lock:
+            if host in self._pinned:
+                return None
+            counts = self._counts.setdefault(host, [0, 0])
+            counts[engine == "playwright"] += 1
+            static_pages, browser_pages = counts
+            if browser_pages >= self.learn_after and browser_pages > static_pages:
+                self._pinned[host] = "playwright"
+            elif static_pages >= self.learn_after and browser_pages == 0:
+                self._pinned[host] = "requests"
+            return self._pinned.get(host)
+
+
+class RobotsCache:
+    """
+    robots.txt rules cached per scheme+host, shared by every worker of a run.
+    Entries expire after `ttl` seconds (failed downloads after `failure_ttl`), and can be
+    persisted to `cache_file` so the next run does not download them again.
+    """
+
+    def __init__(self, ttl=24 * 3600, failure_ttl=300, cache_file=None):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.cache_file = cache_file
+        self._entries = {}  # key -> {"fetched": timestamp, "status": int or None, "body": str}
+        self._parsers = {}  # key -> RobotFileParser built from the entry
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if cache_file:
+            self.load()
+
+    @staticmethod
+    def _key(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+    def _is_fresh(self, entry):
+        status = entry.get("status")
+        ttl = self.ttl if status is not None and status < 500 else self.failure_ttl
+        return time.time() - entry.get("fetched", 0) < ttl
+
+    @staticmethod
+    def _build_parser(entry):
+        """Mirrors RobotFileParser.read(): 401/403 disallow all, other 4xx allow all, 5xx/failures block."""
+        rp = RobotFileParser()
+        status = entry.get("status")
+        if status in (401, 403):
+            rp.disallow_all = True
+        elif status is not None and 400 <= status < 500:
+            rp.allow_all = True
+        elif status is not None and status < 400:
+            rp.parse(entry.get("body", "").splitlines())
+        return rp
+
+    def _get_parser(self, url, session, timeout):
+        key = self._key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                return self._parsers.get(key) or self._parsers.setdefault(key, self._build_parser(entry))
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one worker downloads a given robots.txt; the others wait for its result.
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._is_fresh(entry):
+                    return self._parsers.setdefault(key, self._build_parser(entry))
+            try:
+                resp = session.get(f"{key}/robots.txt", timeout=timeout)
+                entry = {"fetched": time.time(), "status": resp.status_code,
+                         "body": resp.content.decode("utf-8", errors="replace")}
+            except Exception as e:
+                logging.info(f"Could not download robots.txt for {key}: {e!r}")
+                entry = {"fetched": time.time(), "status": None, "body": ""}
+            parser = self._build_parser(entry)
+            with self._lock:
+                self._entries[key] = entry
+                self._parsers[key] = parser
+                self._dirty = True
+            return parser
+
+    def can_fetch(self, url, user_agent, session, timeout=15):
+        rp = self._get_parser(url, session, timeout)
+        if self._entries.get(self._key(url), {}).get("status") is None:
+            # robots.txt could not be downloaded: fail-open, like the uncached check did.
+            return True
+        return rp.can_fetch(user_agent, url)
+
+    def crawl_delay(self, url, user_agent):
+        """Crawl-delay (seconds) from an already cached robots.txt, or 0 if there is none."""
+        rp = self._parsers.get(self._key(url))
+        if rp is None:
+            return 0.0
+        try:
+            return float(rp.crawl_delay(user_agent) or 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def load(self):
+        try:
+            if os.path.exists(self.cache_file) and os.path.getsize(self.cache_file) > 0:
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    with self._lock:
+                        self._entries.update({k: v for k, v in data.items() if self._is_fresh(v)})
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable robots cache {self.cache_file}: {e!r}")
+
+    def save(self):
+        if not self.cache_file or not self._dirty:
+            return
+        try:
+            with self._lock:
+                data = {k: v for k, v in self._entries.items() if self._is_fresh(v)}
+                self._dirty = False
+            tmp_path = self.cache_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except Exception as e:
+            logging.error(f"Failed to save robots cache: {e!r}")
+
+
+class ResponseCache:
+    """
+    On-disk HTTP response cache for the 'requests' engine, keyed by URL.
+    Bodies live in `cache_dir` (one file per URL); the index keeps ETag/Last-Modified and a few headers
+    so re-runs can revalidate with If-None-Match/If-Modified-Since. The least recently used entries are
+    evicted once the bodies exceed `max_bytes`. offline=True replays cached bodies without any network.
+    """
+
+    INDEX_FILE = "index.json"
+    KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Date")
+
+    def __init__(self, cache_dir, max_bytes=500 * 1024 * 1024, offline=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._entries = OrderedDict()  # key -> {"url", "headers", "size", "stored"}; least recently used first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        os.makedirs(cache_dir, exist_ok=True)
+        self.load()
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since for a cached URL ({} if it is not cached)."""
+        with self._lock:
+            entry = self._entries.get(self._key(url))
+            headers = dict(entry["headers"]) if entry else {}
+        conditional = {}
+        if headers.get("ETag"):
+            conditional["If-None-Match"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            conditional["If-Modified-Since"] = headers["Last-Modified"]
+        return conditional
+
+    def read(self, url):
+        """The cached body of a URL (marking it recently used), or None."""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._body_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            self._forget(key)
+            return None
+
+    def store(self, url, body, headers):
+        """Caches a 200 response, then evicts least recently used entries over the size cap."""
+        key = self._key(url)
+        path = self._body_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not cache {url}: {e!r}")
+            return
+
+        entry = {"url": url, "size": len(body), "stored": time.time(),
+                 "headers": {h: headers[h] for h in self.KEPT_HEADERS if h in headers}}
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._size -= old["size"]
+            self._entries[key] = entry
+            self._size += entry["size"]
+            self._dirty = True
+        self._evict()
+
+    def _evict(self):
+        """Drops least recently used entries until the bodies fit in max_bytes (the newest one always stays)."""
+        evicted = []
+        with self._lock:
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, old = self._entries.popitem(last=False)
+                self._size -= old["size"]
+                evicted.append(old_key)
+                self._dirty = True
+        for old_key in evicted:
+            try:
+                os.remove(self._body_path(old_key))
+            except OSError:
+                pass
+
+    def _forget(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._size -= old["size"]
+                self._dirty = True
+
+    def load(self):
+        index_file = os.path.join(self.cache_dir, self.INDEX_FILE)
+        try:
+            if os.path.exists(index_file) and os.path.getsize(index_file) > 0:
+                with open(index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                with self._lock:
+                    for key, entry in data.get("entries", []):  # Stored least recently used first
+                        if os.path.exists(self._body_path(key)):
+                            self._entries[key] = entry
+                            self._size += entry.get("size", 0)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable response cache index {index_file}: {e!r}")
+        self._evict()  # The cap may have been lowered since the last run
+
+    def save(self):
+        if not self._dirty:
+            return
+        index_file = os.path.join(self.cache_dir, self.INDEX_FILE)
+        try:
+            with self._lock:
+                data = {"entries": list(self._entries.items())}
+                self._dirty = False
+            tmp_path = index_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, index_file)
+        except Exception as e:
+            logging.error(f"Failed to save response cache index: {e!r}")
+
+
+class DnsCache:
+    """
+    getaddrinfo() results cached per host for `ttl` seconds and shared by every session of a Scraper,
+    so new connections to a known host skip the lookup. resolve() returns every address of the host,
+    IPv4 addresses first, for the connection to try in turn.
+    """
+
+    def __init__(self, ttl=300.0, on_event=None):
+        self.ttl = ttl
+        self.on_event = on_event
+        self._entries = {}  # host -> (addresses, expires)
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        try:
+            socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+            return (host,)  # Already an IP address
+        except (OSError, ValueError):
+            pass
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry and entry[1] > now:
+            if self.on_event:
+                self.on_event("dns_cache_hits")
+            return entry[0]
+        if self.on_event:
+            self.on_event("dns_lookups")
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        addresses = tuple(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[host] = (addresses, now + self.ttl)
+        return addresses
+
+
+class _TunedConnectionMixin:
+    """Counts every TCP connect and resolves the host through the adapter's DnsCache."""
+
+    adapter = None
+
+    def connect(self):
+        adapter = self.adapter
+        if adapter is not None and adapter.on_event:
+            adapter.on_event("connections_opened")
+        return super().connect()
+
+    def _new_conn(self):
+        adapter = self.adapter
+        if adapter is None or adapter.dns_cache is None:
+            return super()._new_conn()
+        host = self.__dict__.setdefault("_scrapuj_host", self._dns_host)
+        addresses = adapter.dns_cache.resolve(host, self.port)
+        # Like socket.create_connection: the next address is tried when one refuses or times out.
+        # Only the TCP connect is repeated; SNI/Host still use self.host.
+        for address in addresses[:-1]:
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except ConnectTimeoutError:  # Also NewConnectionError (connection refused, unreachable)
+                continue
+        self._dns_host = addresses[-1]
+        return super()._new_conn()
+
+
+class _TunedHTTPConnection(_TunedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TunedHTTPSConnection(_TunedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TunedPoolMixin:
+    adapter = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        conn.adapter = self.adapter
+        return conn
+
+
+class _TunedHTTPConnectionPool(_TunedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _TunedHTTPConnection
+
+
+class _TunedHTTPSConnectionPool(_TunedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _TunedHTTPSConnection
+
+
+class _TunedPoolManager(PoolManager):
+    def __init__(self, *args, adapter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.adapter = adapter
+        self.pool_classes_by_scheme = {"http": _TunedHTTPConnectionPool, "https": _TunedHTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.adapter = self.adapter
+        return pool
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with connection pools sized by the Scraper, an optional per-host connection cap
+    (pool_block), no urllib3-level retries (see RetryPolicy), optional TCP keep-alive and DnsCache,
+    and on_event callbacks ("http_requests", "connections_opened") for connection-reuse metrics.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, on_event=None, dns_cache=None,
+                 tcp_keepalive=False):
+        self.on_event = on_event
+        self.dns_cache = dns_cache
+        self.tcp_keepalive = tcp_keepalive
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0,
+                         pool_block=pool_block)
+
+    @staticmethod
+    def keepalive_socket_options(idle=60, interval=15, probes=4):
+        """SO_KEEPALIVE plus the probe timings the platform supports."""
+        options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        for name, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPALIVE", idle), ("TCP_KEEPINTVL", interval),
+                            ("TCP_KEEPCNT", probes)):
+            if hasattr(socket, name):
+                options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+        return options
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        if self.tcp_keepalive:
+            pool_kwargs["socket_options"] = HTTPConnection.default_socket_options + self.keepalive_socket_options()
+        self.poolmanager = _TunedPoolManager(num_pools=connections, maxsize=maxsize, block=block, adapter=self,
+                                             **pool_kwargs)
+
+    def send(self, request, **kwargs):
+        if self.on_event:
+            self.on_event("http_requests")
+        return super().send(request, **kwargs)
+
+
+class HostSessions:
+    """
+    One requests session per host, shared by all fetch workers, so a host's keep-alive connections
+    are reused by whichever worker fetches from it next (instead of every worker thread opening its
+    own). The least recently used sessions are closed beyond `max_hosts`.
+    """
+
+    def __init__(self, factory, max_hosts=256):
+        self.factory = factory
+        self.max_hosts = max_hosts
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is not None:
+                self._sessions.move_to_end(host)
+                return session
+            session = self._sessions[host] = self.factory()
+            while len(self._sessions) > self.max_hosts:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.close()  # Only drops idle connections; a request in flight still finishes
+            return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class ParsedPage:
+    """
+    One fetched page whose parse trees are built lazily and at most once.
+    The emptiness check, exclusions, CSS selection and XPath selection all share
+    the same object instead of re-parsing the bytes.
+    backend: "lxml" works on the lxml tree only, "bs4" uses BeautifulSoup (plus lxml for XPath).
+    """
+
+    def __init__(self, content, backend="bs4"):
+        self.content = content
+        self.backend = backend
+        self._soup = None
+        self._tree = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self._soup = bs4.BeautifulSoup(self.content, "html.parser")
+        return self._soup
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            # 'requests' provides bytes, Playwright provides a string; lxml is told it is utf-8 either way.
+            data = self.content if isinstance(self.content, bytes) else self.content.encode("utf-8")
+            try:
+                self._tree = html.fromstring(data, parser=html.HTMLParser(encoding="utf-8"))
+            except (etree.ParserError, ValueError):
+                # No elements at all (empty, whitespace, a comment or an XML declaration only): an empty
+                # document, so has_text() is False and the page is retried/escalated as "Empty content".
+                self._tree = html.Element("html")
+        return self._tree
+
+    def parse(self):
+        """Builds the backend's own tree now (instead of on first use); returns self."""
+        if self.backend == "lxml":
+            self.tree
+        else:
+            self.soup
+        return self
+
+    def has_text(self):
+        if self.backend == "lxml":
+            return self.tree.xpath(
+                "boolean(//text()[normalize-space()]"
+                "[not(ancestor::script or ancestor::style or ancestor::template)])")
+        return bool(self.soup.get_text(strip=True))
+
+
+class CompiledSelector:
+    """One template selector, classified and compiled for every backend that can run it."""
+
+    def __init__(self, category, selector, kind, soup=None, xpath=None, lxml_css=None):
+        self.category = category
+        self.selector = selector
+        self.kind = kind  # "css", "xpath" or "invalid"
+        self.soup = soup  # soupsieve pattern (BeautifulSoup backend)
+        self.xpath = xpath  # lxml.etree.XPath
+        self.lxml_css = lxml_css  # lxml CSSSelector (lxml backend)
+
+    def select_lxml(self, tree):
+        if self.kind == "css":
+            return self.lxml_css(tree)
+        if self.kind == "xpath":
+            return self.xpath(tree)
+        return []
+
+
+class CompiledTemplate:
+    """
+    A template whose selectors are split into main/excluded, classified as CSS or XPath and
+    compiled ONCE per run. Both engines reuse it for every URL, and invalid selectors are
+    reported once up front instead of on every page.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.main = []
+        self.excluded = []
+        self.problems = []  # Human-readable warnings, reported once by report()
+        # The lxml backend can run the template only if cssselect understands every CSS selector.
+        self.lxml_ready = CSSSELECT_AVAILABLE
+        # Cleared when the browser rejects a selector (e.g. soupsieve-only CSS); Playwright then parses in Python.
+        self.browser_ready = True
+        self._browser_specs = {}
+
+        for category, selector in template.get("selectors", {}).items():
+            is_excluded = category.endswith("_excluded")
+            compiled = self._compile(category, selector)
+            if is_excluded:
+                if compiled.kind != "css":
+                    # Exclusions are applied with CSS only
+                    self.problems.append(f"Exclusion selector '{selector}' is not valid CSS and was skipped.")
+                    continue
+                self.excluded.append(compiled)
+            else:
+                if compiled.kind == "invalid":
+                    self.problems.append(f"Selector '{selector}' for '{category}' is neither valid CSS nor XPath.")
+                self.main.append(compiled)
+
+        # Fields that must come back for a page to count as scraped (engine="auto" escalates otherwise).
+        # Templates may list them under "required"; by default every main field is required.
+        self.required = list(template.get("required")
+                             or [sel.category for sel in self.main if sel.kind != "invalid"])
+
+    def filled_required(self, row, mode):
+        """How many required fields the row has (in 'urls_only' mode: 1 if it found any links)."""
+        if row is None:
+            return 0
+        if mode == "urls_only":
+            return int(bool(row.get("urls")))
+        return sum(row.get(category) not in (None, "", []) for category in self.required)
+
+    def missing_required(self, row, mode):
+        """True if the row lacks a required field (or, in 'urls_only' mode, found no links at all)."""
+        return self.filled_required(row, mode) < (1 if mode == "urls_only" else len(self.required))
+
+    def _compile(self, category, selector):
+        try:
+            soup_pattern = soupsieve.compile(selector)
+        except soupsieve.SelectorSyntaxError:
+            soup_pattern = None
+        except Exception:
+            soup_pattern = None
+
+        if soup_pattern is not None:
+            lxml_css = None
+            if CSSSELECT_AVAILABLE:
+                try:
+                    lxml_css = lazy_import("lxml.cssselect").CSSSelector(selector, translator="html")
+                except lazy_import("cssselect").SelectorError:
+                    self.lxml_ready = False
+                    self.problems.append(f"Selector '{selector}' is not supported by cssselect; "
+                                         f"using the BeautifulSoup backend for this template.")
+            return CompiledSelector(category, selector, "css", soup=soup_pattern, lxml_css=lxml_css)
+
+        if LXML_AVAILABLE:
+            try:
+                return CompiledSelector(category, selector, "xpath", xpath=etree.XPath(selector))
+            except etree.XPathError:
+                pass
+        return CompiledSelector(category, selector, "invalid")
+
+    def browser_spec(self, mode):
+        """JSON-able argument for BROWSER_EXTRACT_JS (built once per mode)."""
+        links = mode == "urls_only"
+        if links not in self._browser_specs:
+            self._browser_specs[links] = {
+                "skip": sorted(NON_TEXT_TAGS),
+                "excluded": [sel.selector for sel in self.excluded],
+                "main": [{"selector": sel.selector, "kind": sel.kind} for sel in self.main],
+                "links": links,
+            }
+        return self._browser_specs[links]
+
+    def report(self, log_callback=None):
+        for problem in self.problems:
+            logging.warning(problem)
+            if log_callback:
+                log_callback(f"⚠️ {problem}")
+
+
+class BatchSaver:
+    """
+    Collects finished rows (in URL order) and writes them out every `batch_size` URLs.
+    Shared by all engines so the batch-saving rules live in one place.
+    Writing happens on a dedicated writer thread that owns the output files; fetch workers only
+    hand batches over a bounded queue, so they block only when the writer falls `queue_size` batches behind.
+    """
+
+    _STOP = object()  # Queue sentinel: no more batches
+
+    def __init__(self, scraper, mode, output_file=None, json_file=None, final_json_file=None,
+                 metadata_sink=None, log_callback=None, batch_size=100, queue_size=4, manifest=None,
+                 fingerprint=None, completed=0, urls_digest=None):
+        """
+        json_file: the JSON Lines file batches are appended to.
+        final_json_file: if set, finish() converts json_file into this single JSON array file.
+        metadata_sink: MetadataSink that owns the TXT files and metadane.xlsx in 'text_metadata' mode.
+        manifest: RunManifest checkpointed after every written batch (see run_scraper(resume=True)).
+        completed/urls_digest: state carried over from the run being resumed.
+        """
+        self.scraper = scraper
+        self.mode = mode
+        self.output_file = output_file
+        self.json_file = json_file
+        self.final_json_file = final_json_file
+        self.metadata_sink = metadata_sink
+        self.log_callback = log_callback
+        self.batch_size = batch_size
+        self.batch_results = []
+        self.batch_links = []
+        self.manifest = manifest
+        self.fingerprint = fingerprint
+        self._last_idx = completed  # Last URL (in order) whose rows are in a batch
+        self._checkpointed = completed  # Last URL recorded in the manifest
+        self.write_failed = False  # A batch could not be written: no checkpoint may pass it any more
+        self._urls_digest = urls_digest or hashlib.sha256()  # Digest of URLs 1.._last_idx
+        self._last_state = self._state(completed, self._urls_digest.hexdigest()) if manifest else None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._writer_loop, name="BatchSaver-writer", daemon=True)
+        self._writer.start()
+
+    def add(self, scraped_row=None, error_row=None):
+        """Adds the outcome of one URL to the current batch."""
+        if scraped_row:
+            if self.mode == "urls_only":
+                self.batch_links.extend(scraped_row.get("urls", []))
+            else:
+                self.batch_results.append(scraped_row)
+        elif error_row:
+            if self.mode != "urls_only":
+                self.batch_results.append(error_row)
+
+    def after_url(self, idx, num_urls, cancelled=False, url=None):
+        """Saves the batch when `idx` closes a batch (or the run) and the run was not cancelled."""
+        self._last_idx = idx
+        if url is not None:
+            self._urls_digest.update(url.encode("utf-8") + b"\n")
+        if (idx % self.batch_size == 0 or idx == num_urls) and not cancelled:
+            if self.log_callback:
+                self.log_callback(f"💾 Saving batch... (up to URL {idx}/{num_urls})")
+            self.save()
+
+    def save(self):
+        """Hands the current batch to the writer thread and starts a new one."""
+        if self.mode == "urls_only":
+            batch, self.batch_links = self.batch_links, []
+        else:
+            batch, self.batch_results = self.batch_results, []
+        # Blocks while the writer is `queue_size` batches behind
+        with self.scraper._timed("save_wait"):
+            self._queue.put((batch, self._last_idx, self._urls_digest.hexdigest()))
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch, last_idx, urls_digest = item
+            with self.scraper._timed("save"):
+                written = self._write(batch)
+            if not written and not self.write_failed:
+                self.write_failed = True
+                if self.manifest:
+                    # The files may hold part of the failed batch: the last good checkpoint cuts it off on resume
+                    self.manifest.write(self._last_state)
+                    if self.log_callback:
+                        self.log_callback(f"⚠️ Rows after URL {self._checkpointed} could not be saved; "
+                                          f"'Resume' will fetch them again.")
+            if not self.write_failed:
+                self._checkpoint(last_idx, urls_digest)
+
+    def output_files(self):
+        """Files the batches append to (their sizes are checkpointed in the manifest)."""
+        if self.mode == "urls_only":
+            return [self.output_file]
+        files = [self.json_file]
+        if self.metadata_sink:
+            files.append(self.metadata_sink.staging_file)
+        return files
+
+    def _checkpoint(self, completed, urls_digest, finished=False):
+        if not self.manifest:
+            return
+        if self.mode == "urls_only" and completed % self.batch_size and not finished:
+            # Links are deduplicated per batch: a short batch (written on cancel) is redone on resume,
+            # so the resumed file is identical to one written in a single run.
+            return
+        self._checkpointed = completed
+        self._last_state = self._state(completed, urls_digest, finished)
+        self.manifest.write(self._last_state)
+
+    def _state(self, completed, urls_digest, finished=False):
+        """Manifest contents for the output files as they are now."""
+        return {
+            "fingerprint": self.fingerprint,
+            "completed": completed,
+            "urls_digest": urls_digest,
+            "offsets": {path: (os.path.getsize(path) if os.path.exists(path) else 0)
+                        for path in self.output_files()},
+            "metadata_next_index": self.metadata_sink.next_index if self.metadata_sink else 0,
+            "finished": finished,
+        }
+
+    def _write(self, batch):
+        """Writes one batch; returns False if any of it could not be saved."""
+        try:
+            if self.mode == "urls_only":
+                return self.scraper._save_batch_urls(batch, self.output_file, self.log_callback)
+            if self.mode == "text_only":
+                return self.scraper._save_batch_json(batch, self.json_file, self.log_callback)
+            if self.mode == "text_metadata":
+                return self.scraper._save_batch_metadata(batch, self.metadata_sink, self.json_file,
+                                                         self.log_callback)
+            return True
+        except Exception as e:
+            log_msg = f"❌ CRITICAL: Failed to save batch! {e!r}"
+            logging.error(log_msg)
+            if self.log_callback:
+                self.log_callback(log_msg)
+            return False
+
+    @property
+    def last_idx(self):
+        """Index of the last URL (in order) handed to after_url()."""
+        return self._last_idx
+
+    def finish(self, complete=True):
+        """
+        Called once when the run ends (finished or cancelled) to produce the final output files.
+        An incomplete run keeps its staging files and manifest so it can be resumed.
+        """
+        # The last (short) batch, or the rows finished before a cancel
+        if self.batch_results or self.batch_links:
+            if self.log_callback:
+                self.log_callback("💾 Saving the last batch..." if complete
+                                  else "💾 Saving rows finished before the run stopped...")
+            self.save()
+        self._queue.put(self._STOP)
+        self._writer.join()
+        if self.write_failed and self.manifest:
+            complete = False  # Keep the staging files and manifest so 'Resume' can redo the lost rows
+        with self.scraper._timed("finalize"):
+            if self.final_json_file and self.json_file:
+                if self.scraper._convert_jsonl_to_json(self.json_file, self.final_json_file, self.log_callback):
+                    if complete:
+                        os.remove(self.json_file)
+            if self.metadata_sink:
+                self.metadata_sink.finish(self.log_callback, keep_staging=not complete)
+        if complete:
+            self._checkpoint(self._last_idx, self._urls_digest.hexdigest(), finished=True)
+        elif self.manifest and self.log_callback:
+            self.log_callback(f"ℹ️ Run stopped after URL {self._last_idx}. "
+                              f"'Resume' will continue from URL {self._checkpointed + 1}.")
+
+
+class MetadataSink:
+    """
+    Incremental writer for 'text_metadata' mode.
+    TXT files are numbered from an in-memory counter, metadata rows are appended to a JSON Lines
+    staging file (so every batch costs O(batch)), and metadane.xlsx is written once, through a
+    streaming write-only workbook, when the run ends.
+    """
+
+    def __init__(self, export_folder, xlsx_file, main_tag_keys=None, start_index=0):
+        self.export_folder = export_folder
+        self.xlsx_file = xlsx_file
+        self.main_tag_keys = main_tag_keys
+        self.staging_file = os.path.splitext(xlsx_file)[0] + "_rows.jsonl"
+        self.next_index = start_index  # Rows written so far; file names follow the row number
+
+    def _merge_content(self, row):
+        """Merge tags in the user-defined order."""
+        main_tag = self.main_tag_keys
+        merged_content = []
+        if isinstance(main_tag, list):
+            for tag in main_tag:
+                content = row.get(tag, "")
+                if isinstance(content, list):
+                    merged_content.extend(content)
+                elif content:
+                    merged_content.append(str(content))
+        elif main_tag:  # Fallback for a single tag string (should be list from UI)
+            content = row.get(main_tag, "")
+            if isinstance(content, list):
+                merged_content = content
+            elif content:
+                merged_content = [str(content)]
+        return merged_content
+
+    def write_batch(self, batch_results):
+        """Writes TXT files for the batch and stages its metadata rows. Returns the number of TXT files."""
+        metadata_rows = []
+        new_txt_files_count = 0
+
+        for row in batch_results:
+            self.next_index += 1
+            # Don't create TXT files for rows that were errors
+            if "error" in row:
+                metadata_row = dict(row)
+                metadata_row["Nazwa pliku"] = "ERROR"
+                metadata_rows.append(metadata_row)
+                continue
+
+            txt_filename = f"{self.next_index}.txt"  # File names 1, 2, ... 100, 101, ...
+            with open(os.path.join(self.export_folder, txt_filename), "w", encoding="utf-8") as f:
+                f.write("\n\n".join(self._merge_content(row)))  # Join with double newline
+            new_txt_files_count += 1
+
+            metadata_row = dict(row)  # keep everything
+            metadata_row["Nazwa pliku"] = txt_filename
+            metadata_rows.append(metadata_row)
+
+        with open(self.staging_file, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in metadata_rows)
+        return new_txt_files_count
+
+    def _iter_staged_rows(self):
+        with open(self.staging_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short by a crash
+
+    @staticmethod
+    def _cell_value(value, illegal_characters):
+        if value is None:
+            return None
+        if isinstance(value, (int, float, bool)):
+            return value
+        return illegal_characters.sub("", str(value))
+
+    def finish(self, log_callback=None, keep_staging=False):
+        """
+        Builds metadane.xlsx from the staged rows in two streaming passes (columns, then rows).
+        keep_staging: keep the staged rows (an unfinished run that may be resumed appends to them).
+        """
+        if not os.path.exists(self.staging_file):
+            return
+        try:
+            # Pass 1: every column in order of first appearance, 'Nazwa pliku' and 'url' first
+            cols = []
+            seen = set()
+            for row in self._iter_staged_rows():
+                for key in row:
+                    if key not in seen:
+                        seen.add(key)
+                        cols.append(key)
+            if 'url' in cols:
+                cols.insert(0, cols.pop(cols.index('url')))
+            if 'Nazwa pliku' in cols:
+                cols.insert(0, cols.pop(cols.index('Nazwa pliku')))
+
+            # Pass 2: stream rows into a write-only workbook
+            openpyxl = lazy_import("openpyxl")
+            illegal_characters = lazy_import("openpyxl.cell.cell").ILLEGAL_CHARACTERS_RE
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet1")
+            ws.append(cols)
+            count = 0
+            for row in self._iter_staged_rows():
+                ws.append([self._cell_value(row.get(col), illegal_characters) for col in cols])
+                count += 1
+            tmp_file = self.xlsx_file + ".tmp"
+            wb.save(tmp_file)
+            os.replace(tmp_file, self.xlsx_file)
+            if not keep_staging:
+                os.remove(self.staging_file)
+
+            if log_callback:
+                log_callback(f"💾 Metadata for {count} items written to {os.path.basename(self.xlsx_file)}")
+        except Exception as e:
+            log_msg = f"❌ Error writing {os.path.basename(self.xlsx_file)}: {e!r}"
+            logging.error(log_msg)
+            if log_callback:
+                log_callback(log_msg)
+
+
+class UrlSource:
+    """
+    The URLs of a run, read lazily from pasted text, any iterable of strings or a file (one URL per line).
+    Iterating yields stripped, non-empty URLs and skips repeats (remembered as 8-byte hashes, not strings),
+    so multi-million-line URL files never sit in memory as one string or list.
+    """
+
+    def __init__(self, urls=None, path=None, dedupe=True):
+        self.urls = urls if urls is not None else ()
+        self.path = path
+        self.dedupe = dedupe
+        self.yielded = 0  # URLs handed out so far
+        self.duplicates = 0  # Repeated URLs skipped so far
+        self.exhausted = False  # True once the whole input has been read
+
+    def _lines(self):
+        if self.path:
+            with open(self.path, "r", encoding="utf-8-sig", errors="replace") as f:
+                yield from f
+        elif isinstance(self.urls, str):
+            yield from io.StringIO(self.urls)
+        else:
+            yield from self.urls
+
+    def count(self):
+        """
+        Number of URLs iteration will yield (blank lines and repeats left out), or None for an iterable
+        of unknown length. Reads the input once more with the same normalisation as __iter__.
+        """
+        if self.path or isinstance(self.urls, str) or hasattr(self.urls, "__len__"):
+            return sum(1 for _ in UrlSource(self.urls, path=self.path, dedupe=self.dedupe))
+        return None
+
+    def __iter__(self):
+        seen = set()
+        for line in self._lines():
+            url = line.strip()
+            if not url:
+                continue
+            if self.dedupe:
+                key = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+                if key in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(key)
+            self.yielded += 1
+            yield url
+        self.exhausted = True
+
+
+class RunManifest:
+    """
+    Checkpoint of a run, written next to its output after every saved batch.
+    Records how many URLs (always an in-order prefix) are saved, the size of every output file
+    at that point and a digest of those URLs, so run_scraper(resume=True) can cut off partial
+    writes and continue with the next URL.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def fingerprint(template, mode):
+        """Identifies the template + mode; a run can only be resumed with the same ones."""
+        payload = json.dumps({"template": template, "mode": mode}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable run manifest {self.path}: {e!r}")
+            return None
+
+    def write(self, state):
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Failed to write run manifest: {e!r}")
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram. Buckets grow by 10%, so percentiles are accurate to about 5%
+    and memory stays constant however many samples a run records.
+    """
+
+    _BASE = 1e-6  # 1 µs; anything faster lands in bucket 0
+    _GROWTH = 1.1
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = int(math.log(seconds / self._BASE, self._GROWTH)) if seconds > self._BASE else 0
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._BASE * self._GROWTH ** (bucket + 0.5), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 6),
+            "mean_s": round(self.total / self.count, 6) if self.count else 0.0,
+            "p50_s": round(self.percentile(0.50), 6),
+            "p95_s": round(self.percentile(0.95), 6),
+            "p99_s": round(self.percentile(0.99), 6),
+            "max_s": round(self.max, 6),
+        }
+
+
+class _StageTimer:
+    """Context manager returned by RunMetrics.timer()."""
+
+    __slots__ = ("metrics", "stage", "url", "start")
+
+    def __init__(self, metrics, stage, url):
+        self.metrics = metrics
+        self.stage = stage
+        self.url = url
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add(self.stage, time.perf_counter() - self.start, self.url)
+        return False
+
+
+class RunMetrics:
+    """
+    Timing histograms of one run, per stage and per host. Stages:
+    url (one URL end to end), robots, politeness (delay sleeps), fetch (download incl. DNS/connect),
+    time_to_headers (the connect + server wait part of fetch), retry_wait (back-off before a retry),
+    cache_read (replay mode),
+    navigate / script / browser_extract / page_content (Playwright), parse, selectors, clean_text,
+    extract_queue (ExtractionPool: waiting for a free process plus the transfer), save (writing one batch), save_wait (workers blocked on a busy writer) and finalize (final JSON/XLSX).
+    Stage times of parallel workers overlap, so their totals can exceed the run's wall time.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._hosts = {}
+        self._counters = {}  # http_requests, connections_opened, dns_lookups, dns_cache_hits
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def add(self, stage, seconds, url=None):
+        host = urlparse(url).netloc.lower() if url else None
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = LatencyHistogram()
+            hist.add(seconds)
+            if host:
+                host_stages = self._hosts.setdefault(host, {})
+                if stage not in host_stages:
+                    host_stages[stage] = LatencyHistogram()
+                host_stages[stage].add(seconds)
+
+    def timer(self, stage, url=None):
+        return _StageTimer(self, stage, url)
+
+    def totals(self):
+        """Total seconds per stage (what an extraction worker process sends back with each row)."""
+        with self._lock:
+            return {stage: hist.total for stage, hist in self._stages.items()}
+
+    def report(self, **run_info):
+        """Machine-readable summary: run info, wall time, counters and p50/p95/p99 per stage and per host."""
+        with self._lock:
+            wall = time.monotonic() - self._started
+            urls = self._stages["url"].count if "url" in self._stages else 0
+            counters = dict(self._counters)
+            requests_sent = counters.get("http_requests", 0)
+            if requests_sent:
+                reused = max(0, requests_sent - counters.get("connections_opened", 0))
+                counters["connections_reused"] = reused
+                counters["connection_reuse_ratio"] = round(reused / requests_sent, 3)
+            return {
+                **run_info,
+                "wall_s": round(wall, 3),
+                "urls": urls,
+                "urls_per_s": round(urls / wall, 3) if wall > 0 else 0.0,
+                "counters": counters,
+                "stages": {stage: hist.summary() for stage, hist in sorted(self._stages.items())},
+                "hosts": {host: {stage: hist.summary() for stage, hist in sorted(stages.items())}
+                          for host, stages in sorted(self._hosts.items())},
+            }
+
+    def save(self, path, **run_info):
+        report = self.report(**run_info)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Failed to write performance report: {e!r}")
+        return report
+
+    @staticmethod
+    def summary_line(report, top=4):
+        """One log line: throughput plus the stages that took the most (worker) time."""
+        busiest = sorted(((stage, s) for stage, s in report["stages"].items() if stage != "url"),
+                         key=lambda item: item[1]["total_s"], reverse=True)[:top]
+        stages = ", ".join(f"{stage} {s['total_s']:.1f}s (p50 {s['p50_s'] * 1000:.1f} ms, "
+                           f"p95 {s['p95_s'] * 1000:.1f} ms)" for stage, s in busiest)
+        line = (f"⏱️ {report['urls']} URLs in {report['wall_s']:.1f}s ({report['urls_per_s']:.2f}/s). "
+                f"Most time: {stages or 'n/a'}")
+        counters = report.get("counters", {})
+        if counters.get("http_requests"):
+            line += (f". {counters['http_requests']} requests over {counters.get('connections_opened', 0)} new "
+                     f"connections ({counters['connection_reuse_ratio']:.0%} reused)")
+        return line
+
+
+_extraction_worker = {}  # Per worker process: the Scraper and CompiledTemplate built by the initializer
+
+
+def _init_extraction_worker(template, parser_backend):
+    """ExtractionPool initializer: compiles the run's template once per worker process."""
+    _extraction_worker["scraper"] = Scraper(parser_backend=parser_backend, dns_cache_ttl=0)
+    _extraction_worker["template"] = CompiledTemplate(template)
+
+
+def _extract_in_worker(content, url, mode, collect_metrics):
+    """
+    Runs Scraper._extract_if_has_text in a worker process. content: the page bytes, or
+    (shared memory name, size) for large pages. Returns (row or None, {stage: seconds}).
+    """
+    if isinstance(content, tuple):
+        shm = shared_memory.SharedMemory(name=content[0])
+        try:
+            content = bytes(shm.buf[:content[1]])
+        finally:
+            shm.close()
+    scraper = _extraction_worker["scraper"]
+    scraper.metrics = RunMetrics() if collect_metrics else None
+    row = scraper._extract_if_has_text(content, url, _extraction_worker["template"], mode)
+    return row, (scraper.metrics.totals() if collect_metrics else {})
+
+
+class ExtractionPool:
+    """
+    Optional process pool for the CPU-bound part of a run (parsing, selectors, clean_text), so
+    extraction uses every core instead of the GIL-bound fetch threads. Every worker process compiles
+    the template once; pages go out as bytes and rows come back as dicts. Pages of at least
+    `shared_min_bytes` are handed over in shared memory instead of being pickled through the task pipe.
+    """
+
+    def __init__(self, template, parser_backend, processes, collect_metrics=True, on_timing=None,
+                 log_callback=None, shared_min_bytes=256 * 1024):
+        self.processes = processes
+        self.collect_metrics = collect_metrics
+        self.on_timing = on_timing  # on_timing(stage, seconds, url), e.g. Scraper._record
+        self.log_callback = log_callback
+        self.shared_min_bytes = shared_min_bytes
+        self.broken = False  # Set when a worker process died; the run then extracts in-process
+        self._lock = threading.Lock()
+        # "spawn" on every platform: forking a process that runs fetch threads could copy held locks
+        self._executor = ProcessPoolExecutor(max_workers=processes,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_extraction_worker,
+                                             initargs=(template, parser_backend))
+
+    def submit(self, content, url, mode):
+        """Starts the extraction of one page; the Future resolves to (row or None, {stage: seconds})."""
+        shm = None
+        payload = content
+        if isinstance(content, bytes) and len(content) >= self.shared_min_bytes:
+            shm = shared_memory.SharedMemory(create=True, size=len(content))
+            shm.buf[:len(content)] = content
+            payload = (shm.name, len(content))
+        try:
+            future = self._executor.submit(_extract_in_worker, payload, url, mode, self.collect_metrics)
+        except Exception:
+            if shm is not None:
+                self._release(shm)
+            raise
+        if shm is not None:
+            future.add_done_callback(lambda _: self._release(shm))
+        return future
+
+    def extract(self, content, url, mode):
+        """Extracts one page in a worker process and waits for its row (None if the page has no text)."""
+        started = time.perf_counter()
+        row, timings = self.submit(content, url, mode).result()
+        if self.on_timing:
+            for stage, seconds in timings.items():
+                self.on_timing(stage, seconds, url)
+            self.on_timing("extract_queue", max(0.0, time.perf_counter() - started - sum(timings.values())), url)
+        return row
+
+    def mark_broken(self, error):
+        with self._lock:
+            if self.broken:
+                return
+            self.broken = True
+        logging.error(f"An extraction process died, extracting in-process from now on: {error!r}")
+        if self.log_callback:
+            self.log_callback(f"⚠️ An extraction process died ({error!r}); extracting in-process from now on.")
+
+    @staticmethod
+    def _release(shm):
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def map_in_order(func, items, workers, cancel_flag=None, start=1):
+    """
+    Runs func(idx, item) for every item on a pool of `workers` threads and yields
+    (idx, item, result) strictly in input order. At most 2 * workers items are in
+    flight, so memory stays bounded for long URL lists. On cancel, URLs that have
+    not started yet are dropped and only the finished in-order prefix is yielded.
+    start: index of the first item (a resumed run continues the numbering).
+    """
+    if workers <= 1:
+        for idx, item in enumerate(items, start=start):
+            if cancel_flag and cancel_flag():
+                return
+            yield idx, item, func(idx, item)
+        return
+
+    pending = deque()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrapuj-fetch")
+    try:
+        for idx, item in enumerate(items, start=start):
+            if cancel_flag and cancel_flag():
+                break
+            pending.append((idx, item, pool.submit(func, idx, item)))
+            if len(pending) >= workers * 2:
+                done_idx, done_item, future = pending.popleft()
+                yield done_idx, done_item, future.result()
+
+        while pending:
+            if cancel_flag and cancel_flag():
+                for _, _, future in pending:
+                    future.cancel()
+            done_idx, done_item, future = pending.popleft()
+            if future.cancelled():
+                break
+            yield done_idx, done_item, future.result()
+    finally:
+        for _, _, future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+DEFAULT_BLOCKED_RESOURCES = ("image", "stylesheet", "font", "media")
+DEFAULT_BLOCKED_HOSTS = (
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com", "google-analytics.com",
+    "googletagmanager.com", "adservice.google.com", "amazon-adsystem.com", "adnxs.com", "criteo.com",
+    "taboola.com", "outbrain.com", "scorecardresearch.com", "quantserve.com", "hotjar.com",
+    "facebook.net", "connect.facebook.net", "clarity.ms",
+)
+
+
+class ResourceBlocker:
+    """
+    Playwright route handler registered once per browser context.
+    Aborts requests for the blocked resource types and for blocked hosts (and their subdomains);
+    both are precompiled into frozensets so every intercepted request costs the same.
+    """
+
+    def __init__(self, resource_types=DEFAULT_BLOCKED_RESOURCES, hosts=DEFAULT_BLOCKED_HOSTS):
+        self.resource_types = frozenset(resource_types or ())
+        self.hosts = frozenset(h.lower().lstrip(".") for h in (hosts or ()))
+
+    def is_blocked_host(self, host):
+        # Check the host and each parent domain: "a.b.doubleclick.net" -> "b.doubleclick.net" -> ...
+        while host:
+            if host in self.hosts:
+                return True
+            dot = host.find(".")
+            if dot < 0:
+                return False
+            host = host[dot + 1:]
+        return False
+
+    def __call__(self, route):
+        request = route.request
+        if request.resource_type in self.resource_types or (
+                self.hosts and self.is_blocked_host((urlparse(request.url).hostname or ""))):
+            route.abort()
+        else:
+            route.continue_()
+
+    def install(self, context):
+        """Registers the handler on a context (pages created later inherit it)."""
+        if self.resource_types or self.hosts:
+            context.route("**/*", self)
+
+
+class PlaywrightPool:
+    """
+    `size` Playwright pages working in parallel, one per worker thread.
+    The sync API is bound to the thread that started it, so every worker starts its own Playwright and
+    launches its own Chromium (talking to it over Playwright's private pipe: no remote-debugging port is
+    opened). Worker 1 starts first so that a missing browser fails start() right away.
+    Each worker owns a context + page and recovers them on its own.
+    """
+
+    def __init__(self, size=1, headless=True, context_args=None, timeout=60000, log_callback=None, blocker=None):
+        """blocker: optional ResourceBlocker installed once on every context the pool creates."""
+        self.size = max(1, int(size))
+        self.blocker = blocker
+        self.headless = headless
+        self.context_args = context_args or {}
+        self.timeout = timeout
+        self.log_callback = log_callback
+        self._tasks = queue.Queue()
+        self._threads = []
+        self._browser_ready = threading.Event()
+        self._startup_error = None
+        self._alive = 0
+        self._alive_lock = threading.Lock()
+
+    @property
+    def alive(self):
+        """False once every worker has given up (browser or contexts unresponsive)."""
+        return self._alive > 0
+
+    def start(self):
+        """Launches the browser and the workers. Raises if Chromium could not be started."""
+        self._alive = self.size
+        for n in range(self.size):
+            thread = threading.Thread(target=self._worker, args=(n,), name=f"scrapuj-browser-{n + 1}",
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+            if n == 0:
+                self._browser_ready.wait()
+                if self._startup_error:
+                    self.close()
+                    raise self._startup_error
+        return self
+
+    def submit(self, task):
+        """Queues task(page) for the next free page and returns a Future with its result."""
+        future = Future()
+        with self._alive_lock:
+            if self._alive > 0:
+                self._tasks.put((task, future))
+                return future
+        future.set_exception(RuntimeError("Playwright pool is not running (all pages failed)"))
+        return future
+
+    def run(self, task):
+        """submit() and wait for the result."""
+        return self.submit(task).result()
+
+    def close(self):
+        """Lets queued tasks finish, then closes every page, context and finally the browser."""
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _log(self, msg):
+        if self.log_callback:
+            self.log_callback(msg)
+
+    def _new_page(self, browser):
+        context = browser.new_context(**self.context_args)
+        if self.blocker:
+            self.blocker.install(context)
+        page = context.new_page()
+        page.set_default_timeout(self.timeout)
+        return context, page
+
+    def _recover(self, browser, context, page):
+        """The page is broken: replace it (or, failing that, the whole context). Returns (context, page)."""
+        self._log("ℹ️ Attempting to recover Playwright session...")
+        try:
+            page.close()  # Close the broken page
+            page = context.new_page()  # Create a fresh page from the same context
+            page.set_default_timeout(self.timeout)
+        except Exception:
+            try:
+                context.close()
+            except Exception:
+                pass
+            context, page = self._new_page(browser)  # Raises if the browser itself is dead
+        self._log("✅ Playwright session recovered. Continuing to next URL.")
+        return context, page
+
+    def _worker(self, n):
+        pw = browser = context = None
+        try:
+            try:
+                pw = sync_playwright().start()
+                browser = pw.chromium.launch(headless=self.headless)
+            except Exception as e:
+                if n > 0:
+                    raise
+                self._startup_error = e
+                return
+            finally:
+                if n == 0:
+                    self._browser_ready.set()
+
+            context, page = self._new_page(browser)
+            while True:
+                item = self._tasks.get()
+                if item is None:
+                    break
+                task, future = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = task(page)
+                    future.set_result(result)
+                    broken = isinstance(result, dict) and result.get("status") == "error"
+                except Exception as e:
+                    future.set_exception(e)
+                    broken = True
+                if broken:
+                    try:
+                        context, page = self._recover(browser, context, page)
+                    except Exception as recovery_e:
+                        # If this recovery fails, the whole context or browser is dead.
+                        logging.error(f"Critical error: Failed to recover Playwright context: {recovery_e!r}")
+                        self._log(f"💥 CRITICAL: Playwright page {n + 1} is unresponsive. Retiring it.")
+                        break
+        except Exception as e:
+            logging.error(f"Playwright worker {n + 1} failed: {e!r}")
+            self._log(f"💥 A critical Playwright error occurred: {e!r}")
+        finally:
+            self._retire()
+            try:
+                if context:
+                    context.close()
+            except Exception:
+                pass
+            try:
+                if browser:
+                    browser.close()
+                if pw:
+                    pw.stop()
+            except Exception:
+                pass
+
+    def _retire(self):
+        """Marks one worker as gone; the last one fails every task still waiting in the queue."""
+        with self._alive_lock:
+            self._alive -= 1
+            if self._alive > 0:
+                return
+            while True:
+                try:
+                    item = self._tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None and item[1].set_running_or_notify_cancel():
+                    item[1].set_exception(RuntimeError("Playwright pool is not running (all pages failed)"))
+
+
+# ----------------------------
+# Scraper Logic (Backend)
+# ----------------------------
+class Scraper:
+    def __init__(self, *, rotate_user_agent=True, min_delay=1.0, max_delay=3.0, proxies=None, retry_total=3,
+                 workers=1, async_concurrency=500, per_host_limit=4, timeout=15, robots_ttl=24 * 3600,
+                 robots_cache_file=None, parser_backend="bs4", output_format="json", browser_pages=1,
+                 blocked_resources=DEFAULT_BLOCKED_RESOURCES, blocked_hosts=DEFAULT_BLOCKED_HOSTS,
+                 browser_extraction=False, response_cache_dir=None, response_cache_max_mb=500,
+                 replay_from_cache=False, collect_metrics=True, retry_budget=60.0, tcp_keepalive=False,
+                 dns_cache_ttl=300, extraction_processes=0):
+        """
+        rotate_user_agent: pick random UA for each session
+        min_delay/max_delay: random sleep between requests to the same host (seconds)
+        proxies: dict to pass to requests (e.g. {"http": "...", "https": "..."})
+        retry_total: number of retries for transient errors (see RetryPolicy)
+        retry_budget: total time (seconds) one URL may spend on attempts and backoff before it is given up
+                      (counted from its first attempt, so waiting for the host's first politeness slot is free)
+        workers: number of concurrent fetch workers for the 'requests' engine
+        async_concurrency: max in-flight fetches (and pooled connections) for the 'async' engine
+        per_host_limit: max simultaneous fetches (pooled connections) to one host ('requests', 'auto', 'async')
+        timeout: per-request network timeout (seconds)
+        robots_ttl: how long a downloaded robots.txt stays valid (seconds)
+        robots_cache_file: optional JSON file to keep robots.txt rules between runs
+        parser_backend: "bs4" (BeautifulSoup html.parser) or "lxml" (several times faster, needs cssselect; opt-in
+                        because lxml repairs malformed HTML differently, e.g. unclosed <li>/<p> give other values)
+        output_format: "json" (rows streamed to .jsonl, converted to one JSON array at the end)
+                       or "jsonl" (keep the JSON Lines file as the final output)
+        browser_pages: number of pages the 'playwright' engine drives in parallel (one browser per page)
+        blocked_resources: Playwright resource types that are never downloaded (image, stylesheet, ...)
+        blocked_hosts: ad/analytics hosts (subdomains included) that Playwright never contacts
+        browser_extraction: run the template inside the page (one evaluate() call) instead of
+                            serializing it with page.content() and parsing it in Python. Faster, but opt-in:
+                            it reads text like the lxml backend, so XPath hits lose the text that follows
+                            them (the default path returns e.g. "X tail-text" where this returns "X")
+        response_cache_dir: optional folder for the on-disk HTTP response cache ('requests' and 'auto' engines)
+        response_cache_max_mb: size cap of the response cache; least recently used pages are evicted
+        replay_from_cache: offline mode, pages are served from the response cache only (no network)
+        collect_metrics: time every stage (see RunMetrics) and write <output name>_perf.json after each run
+        tcp_keepalive: enable TCP keep-alive probes on pooled connections (keeps idle connections usable
+                       through NATs/firewalls on long runs)
+        dns_cache_ttl: seconds a resolved host address is reused by new connections (0 disables the DNS cache)
+        extraction_processes: worker processes that parse and extract pages fetched by the 'requests', 'auto'
+                              and 'async' engines (see ExtractionPool); 0 extracts in the fetching threads
+        """
+        self.template = {"selectors": {}}
+        self.rotate_user_agent = rotate_user_agent
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.proxies = proxies
+        self.retry_total = retry_total
+        self.retry_policy = RetryPolicy(max_retries=retry_total, budget=retry_budget)
+        self.workers = max(1, int(workers))
+        self.async_concurrency = max(1, int(async_concurrency))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.timeout = timeout
+        self.robots = RobotsCache(ttl=robots_ttl, cache_file=robots_cache_file)
+        self._robots_session = None
+        self._robots_session_lock = threading.Lock()
+        self.parser_backend = parser_backend
+        self.output_format = output_format
+        self._error_log_lock = threading.Lock()
+        self.browser_pages = max(1, int(browser_pages))
+        self.blocker = ResourceBlocker(blocked_resources, blocked_hosts)
+        self.browser_extraction = browser_extraction
+        self.response_cache = None
+        if response_cache_dir:
+            self.response_cache = ResponseCache(response_cache_dir, max_bytes=response_cache_max_mb * 1024 * 1024,
+                                                offline=replay_from_cache)
+        self.collect_metrics = collect_metrics
+        self.metrics = None  # RunMetrics of the run in progress
+        self.tcp_keepalive = tcp_keepalive
+        self.dns_cache_ttl = dns_cache_ttl
+        self.dns_cache = DnsCache(dns_cache_ttl, on_event=self._count) if dns_cache_ttl else None
+        self.extraction_processes = max(0, int(extraction_processes))
+        self._extraction_pool = None  # ExtractionPool of the run in progress
+
+    def _default_headers(self):
+        # Choose user-agent
+        ua = random.choice(USER_AGENTS) if self.rotate_user_agent else DEFAULT_USER_AGENT
+        return {
+            "User-Agent": ua,
+            "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7",
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            "Referer": "https://www.google.com/",
+        }
+
+    def _make_session(self):
+        session = requests.Session()
+        session.headers.update(self._default_headers())
+
+        # Pools sized for the run's concurrency: at most `per_host_limit` connections per host (workers
+        # wait for a free one instead of opening and discarding extras). No retries at the urllib3
+        # level: every engine retries through the Scraper's RetryPolicy.
+        adapter = TunedHTTPAdapter(pool_connections=10, pool_maxsize=min(self.workers, self.per_host_limit),
+                                   pool_block=True, on_event=self._count, dns_cache=self.dns_cache,
+                                   tcp_keepalive=self.tcp_keepalive)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if self.proxies:
+            session.proxies.update(self.proxies)
+
+        return session
+
+    def _parser_backend(self):
+        """The extraction backend actually used: lxml needs the optional cssselect package."""
+        if self.parser_backend == "lxml" and CSSSELECT_AVAILABLE:
+            return "lxml"
+        return "bs4"
+
+    def read_template(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def clean_text(self, el):
+        """Clean a BeautifulSoup element, preserving paragraphs and line breaks."""
+        for br in el.find_all("br"):
+            br.replace_with("\n")
+        for p in el.find_all("p"):
+            p.insert_before("\n\n")
+        return self._clean_lines(el.get_text())
+
+    def clean_lxml_text(self, el):
+        """
+        lxml twin of clean_text: <br> becomes a line break, nested <p> starts a new paragraph,
+        and script/style/comment text is left out, exactly like BeautifulSoup's get_text().
+        """
+        parts = []
+        stack = [(el, False)]
+        while stack:
+            node, closing = stack.pop()
+            if closing:
+                if node.tail:
+                    parts.append(node.tail)
+                continue
+            if node is not el:
+                stack.append((node, True))  # Emit the tail once the subtree is done
+            tag = node.tag
+            if not isinstance(tag, str):
+                continue  # Comment or processing instruction: only its tail is text
+            if node is not el:
+                if tag == "br":
+                    parts.append("\n")
+                elif tag == "p":
+                    parts.append("\n\n")
+                if tag in NON_TEXT_TAGS:
+                    continue
+            if node.text:
+                parts.append(node.text)
+            stack.extend((child, False) for child in reversed(node))
+        return self._clean_lines("".join(parts))
+
+    @staticmethod
+    def _clean_lines(text):
+        lines = text.splitlines()
+        cleaned_lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in lines if line.strip()]
+        return "\n".join(cleaned_lines)
+
+    def _get_robots_session(self):
+        """Session used for robots.txt downloads by engines that have no requests session of their own."""
+        with self._robots_session_lock:
+            if self._robots_session is None:
+                self._robots_session = self._make_session()
+            return self._robots_session
+
+    def _is_allowed_by_robots(self, url, user_agent, session=None):
+        """
+        Return True if either robots.txt allows the URL for our user-agent, or if checking fails (fail-open).
+        robots.txt is downloaded once per host through the scraper's own session and then served from cache.
+        """
+        try:
+            return self.robots.can_fetch(url, user_agent, session or self._get_robots_session(), self.timeout)
+        except Exception:
+            # If robots.txt cannot be read, we choose to proceed (fail-open) — adjust if you prefer fail-closed.
+            return True
+
+    def _timed(self, stage, url=None):
+        """Times a `with` block as `stage` of the current run (no-op when metrics are off)."""
+        metrics = self.metrics
+        return metrics.timer(stage, url) if metrics else contextlib.nullcontext()
+
+    def _record(self, stage, seconds, url=None):
+        metrics = self.metrics
+        if metrics:
+            metrics.add(stage, seconds, url)
+
+    def _count(self, counter, amount=1):
+        metrics = self.metrics
+        if metrics:
+            metrics.count(counter, amount)
+
+    def _detect_captcha(self, text):
+        if not text:
+            return False
+        return bool(CAPTCHA_PATTERNS.search(text))
+
+    def _save_batch_urls(self, batch_links, output_file, log_callback=None):
+        """Appends a batch of links to a TXT file. Returns False if it could not be written."""
+        if not batch_links:
+            return True
+
+        try:
+            # Deduplicate links within this batch
+            unique_links = list(dict.fromkeys(batch_links))
+
+            # Use "a" mode to append. Add a newline to separate from previous batches.
+            with open(output_file, "a", encoding="utf-8") as f:
+                # Add a newline only if the file is not empty
+                if f.tell() > 0:
+                    f.write("\n")
+                f.write("\n".join(unique_links))
+
+            if log_callback:
+                log_callback(f"💾 Batch of {len(unique_links)} links saved to {os.path.basename(output_file)}")
+            return True
+        except Exception as e:
+            log_msg = f"❌ Error saving URL batch: {e!r}"
+            logging.error(log_msg)
+            if log_callback:
+                log_callback(log_msg)
+            return False
+
+    def _save_batch_json(self, batch_results, json_file, log_callback=None):
+        """
+        Appends a batch of results to a JSON Lines file (one JSON object per line).
+        Only the new batch is written, so saving costs O(batch) however large the file already is.
+        Returns False if the batch could not be written.
+        """
+        if not batch_results:
+            return True
+
+        try:
+            with open(json_file, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in batch_results)
+
+            if log_callback:
+                log_callback(f"💾 Batch of {len(batch_results)} items saved to {os.path.basename(json_file)}")
+            return True
+        except Exception as e:
+            log_msg = f"❌ Error saving JSON batch: {e!r}"
+            logging.error(log_msg)
+            if log_callback:
+                log_callback(log_msg)
+            return False
+
+    def _convert_jsonl_to_json(self, jsonl_file, json_file, log_callback=None):
+        """
+        Streams a JSON Lines file into a single indented JSON array (same layout as json.dump(..., indent=2)),
+        one row at a time, so memory use does not depend on the run size.
+        """
+        if not os.path.exists(jsonl_file):
+            return False
+
+        tmp_file = json_file + ".tmp"
+        count = 0
+        try:
+            with open(jsonl_file, "r", encoding="utf-8") as src, open(tmp_file, "w", encoding="utf-8") as dst:
+                dst.write("[")
+                for line_no, line in enumerate(src, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; everything before it is still valid.
+                        logging.warning(f"Skipping corrupted line {line_no} in {os.path.basename(jsonl_file)}")
+                        continue
+                    dst.write(",\n  " if count else "\n  ")
+                    dst.write(json.dumps(row, indent=2, ensure_ascii=False).replace("\n", "\n  "))
+                    count += 1
+                dst.write("\n]" if count else "]")
+            os.replace(tmp_file, json_file)
+            if log_callback:
+                log_callback(f"💾 {count} items written to {os.path.basename(json_file)}")
+            return True
+        except Exception as e:
+            log_msg = f"❌ Error converting {os.path.basename(jsonl_file)} to JSON: {e!r}"
+            logging.error(log_msg)
+            if log_callback:
+                log_callback(log_msg)
+            return False
+
+    def _log_error_to_file(self, error_file, url, error_message):
+        """Appends a failed URL and error message to a log file."""
+        if not error_file:
+            return
+        try:
+            # Ensure error_message is a single line
+            clean_message = str(error_message).replace('\n', ' ').replace('\r', '')
+            with self._error_log_lock, open(error_file, "a", encoding="utf-8") as f:
+                f.write(f"{url}\t{clean_message}\n")
+        except Exception as e:
+            # Log to console if writing to file fails
+            logging.error(f"Failed to write to error log file: {e!r}")
+
+    def _save_batch_metadata(self, batch_results, metadata_sink, json_file, log_callback=None):
+        """
+        Saves a batch for 'text_metadata' mode: appends to JSON, writes new TXT files and stages XLSX rows.
+        Returns False if any part of it could not be written.
+        """
+        if not batch_results:
+            return True
+
+        # 1. Save to the master JSON file
+        saved = self._save_batch_json(batch_results, json_file, log_callback)
+
+        # 2. Write TXT files and stage the metadata rows (the XLSX itself is written when the run ends)
+        try:
+            new_txt_files_count = metadata_sink.write_batch(batch_results)
+            if log_callback:
+                log_callback(f"💾 Batch of {new_txt_files_count} TXT files saved.")
+                log_callback(f"💾 Metadata for {len(batch_results)} items staged for "
+                             f"{os.path.basename(metadata_sink.xlsx_file)}")
+        except Exception as e:
+            log_msg = f"❌ Error saving metadata batch: {e!r}"
+            logging.error(log_msg)
+            if log_callback:
+                log_callback(log_msg)
+            return False
+        return saved
+
+    def _backend_for(self, compiled):
+        """Backend for a compiled template: lxml unless disabled or the template needs soupsieve-only CSS."""
+        if self._parser_backend() == "lxml" and compiled.lxml_ready:
+            return "lxml"
+        return "bs4"
+
+    @staticmethod
+    def _compiled(template):
+        """Accepts a raw template dict or an already CompiledTemplate."""
+        return template if isinstance(template, CompiledTemplate) else CompiledTemplate(template)
+
+    def _extract_from_content(self, page_content, url, template, mode, parsed_page=None):
+        """
+        Internal helper to extract data from raw HTML content based on the template and mode.
+        This is the core extraction logic, now reusable by both 'requests' and 'playwright' engines.
+        template: a CompiledTemplate (compiled once per run) or a raw template dict.
+        parsed_page: an already built ParsedPage for page_content, so nothing is parsed twice.
+        """
+        compiled = self._compiled(template)
+        page = parsed_page
+        if page is None:
+            with self._timed("parse", url):
+                page = ParsedPage(page_content, self._backend_for(compiled)).parse()
+        if page.backend == "lxml":
+            return self._extract_with_lxml(page.tree, url, compiled, mode)
+
+        started = time.perf_counter()
+        clean_time = 0.0
+        row = {"url": url}
+        soup = page.soup
+        all_links_for_url_mode = []  # For 'urls_only' mode
+
+        # 1. PRZETWARZANIE WYKLUCZANIA
+        # Usuń z soup elementy pasujące do selektorów wykluczonych.
+        # Jest to konieczne, jeśli główny selektor (np. 'treść') zawiera te, które mają być pominięte (np. 'photo_excluded').
+        for excluded in compiled.excluded:
+            try:
+                excluded_elements = excluded.soup.select(soup)
+                for el in excluded_elements:
+                    el.decompose()  # Usuń element z drzewa BeautifulSoup
+                logging.debug(f"Successfully decomposed {len(excluded_elements)} elements for {excluded.category}")
+            except Exception as e:
+                logging.error(f"Error during exclusion for '{excluded.selector}': {e!r}")
+
+        # 2. PRZETWARZANIE GŁÓWNYCH SELEKTORÓW
+        for selector in compiled.main:
+            els = []
+            try:
+                if selector.kind == "css":
+                    els = selector.soup.select(soup)
+                elif selector.kind == "xpath":
+                    # The lxml tree is built on first use and shared by all XPath selectors of the page
+                    lxml_els = selector.xpath(page.tree)
+                    # Convert lxml elements to BeautifulSoup elements for consistent processing.
+                    els = [bs4.BeautifulSoup(etree.tostring(l_el, encoding='unicode'), 'html.parser')
+                           for l_el in lxml_els]
+            except Exception as e:
+                logging.info(f"Selector '{selector.selector}' failed for {url}: {e!r}")
+                els = []
+
+            if els:
+                clean_started = time.perf_counter()
+                texts = [self.clean_text(el) for el in els if el.get_text(strip=True)]
+                clean_time += time.perf_counter() - clean_started
+                links = []
+                for el in els:
+                    if el.name == "a" and el.get("href"):
+                        links.append(urljoin(url, el["href"]))
+                    for a in el.find_all("a", href=True):
+                        links.append(urljoin(url, a["href"]))
+
+                if mode in ["text_only", "text_metadata"]:
+                    row[selector.category] = texts[0] if len(texts) == 1 else texts
+                elif mode == "urls_only":
+                    all_links_for_url_mode.extend(links)  # Collect all links
+            else:
+                if mode in ["text_only", "text_metadata"]:
+                    row[selector.category] = None
+
+        if mode == "urls_only":
+            row["urls"] = all_links_for_url_mode  # Add collected links to the row
+
+        self._record_extraction(started, clean_time, url)
+        return row
+
+    def _extract_with_lxml(self, tree, url, compiled, mode):
+        """
+        lxml-native twin of the BeautifulSoup extraction: CSS is compiled to XPath by cssselect,
+        exclusions are dropped from the lxml tree and text/links are read straight from lxml nodes.
+        Produces the same row structure as the BeautifulSoup path.
+        """
+        started = time.perf_counter()
+        clean_time = 0.0
+        row = {"url": url}
+        all_links_for_url_mode = []
+
+        # 1. Exclusions (CSS only, like the BeautifulSoup path)
+        for excluded in compiled.excluded:
+            excluded_elements = excluded.lxml_css(tree)
+            for el in excluded_elements:
+                if el.getparent() is not None:
+                    el.drop_tree()  # Removes the element but keeps the text that follows it
+            logging.debug(f"Successfully removed {len(excluded_elements)} elements for {excluded.category}")
+
+        # 2. Main selectors
+        for selector in compiled.main:
+            try:
+                els = selector.select_lxml(tree)
+            except Exception as e:
+                logging.info(f"Selector '{selector.selector}' failed for {url}: {e!r}")
+                els = []
+            els = [el for el in els if isinstance(el, etree.ElementBase) and isinstance(el.tag, str)]
+
+            if els:
+                if mode in ["text_only", "text_metadata"]:
+                    clean_started = time.perf_counter()
+                    texts = [t for t in (self.clean_lxml_text(el) for el in els) if t]
+                    clean_time += time.perf_counter() - clean_started
+                    row[selector.category] = texts[0] if len(texts) == 1 else texts
+                elif mode == "urls_only":
+                    for el in els:
+                        if el.tag == "a" and el.get("href"):
+                            all_links_for_url_mode.append(urljoin(url, el.get("href")))
+                        for a in el.iterdescendants("a"):
+                            if a.get("href") is not None:
+                                all_links_for_url_mode.append(urljoin(url, a.get("href")))
+            else:
+                if mode in ["text_only", "text_metadata"]:
+                    row[selector.category] = None
+
+        if mode == "urls_only":
+            row["urls"] = all_links_for_url_mode
+
+        self._record_extraction(started, clean_time, url)
+        return row
+
+    def _record_extraction(self, started, clean_time, url):
+        """Splits the time of one extraction into 'selectors' and 'clean_text'."""
+        if self.metrics:
+            self.metrics.add("selectors", time.perf_counter() - started - clean_time, url)
+            self.metrics.add("clean_text", clean_time, url)
+
+    def _extract_from_page(self, page, template, mode):
+        """
+        Extracts a row from the live Playwright page.
+        With browser_extraction the selectors, exclusions and text walk run inside the page in one
+        evaluate() call and only the matched text comes back; otherwise (or when the browser cannot
+        run one of the selectors) the DOM is serialized with page.content() and parsed in Python.
+        """
+        compiled = self._compiled(template)
+        url = page.url
+        if self.browser_extraction and compiled.browser_ready:
+            with self._timed("browser_extract", url):
+                matches = page.evaluate(BROWSER_EXTRACT_JS, compiled.browser_spec(mode))
+            if matches is not None:
+                return self._row_from_browser_matches(matches, url, compiled, mode)
+            compiled.browser_ready = False
+            logging.info("The browser could not run a template selector; extracting with the Python parser.")
+        with self._timed("page_content", url):
+            page_content = page.content()
+        return self._extract_from_content(page_content=page_content, url=url, template=compiled, mode=mode)
+
+    def _row_from_browser_matches(self, matches, url, compiled, mode):
+        """Builds the same row as _extract_with_lxml from BROWSER_EXTRACT_JS output."""
+        started = time.perf_counter()
+        row = {"url": url}
+        all_links_for_url_mode = []
+        for selector, found in zip(compiled.main, matches):
+            if found is None:
+                if mode in ["text_only", "text_metadata"]:
+                    row[selector.category] = None
+            elif mode in ["text_only", "text_metadata"]:
+                texts = [t for t in (self._clean_lines(raw) for raw in found) if t]
+                row[selector.category] = texts[0] if len(texts) == 1 else texts
+            elif mode == "urls_only":
+                all_links_for_url_mode.extend(urljoin(url, href) for href in found)
+
+        if mode == "urls_only":
+            row["urls"] = all_links_for_url_mode
+
+        self._record("clean_text", time.perf_counter() - started, url)
+        return row
+
+    def _process_playwright_page(self, page, url, template, mode, scrape_script=None, log_callback=None,
+                                 cancel_flag=None):
+        """
+        Process a SINGLE page/URL using an EXISTING Playwright page object.
+        This contains the script execution and data extraction logic.
+        """
+        collected_rows = []
+        scrape_called_by_user = False  # Flag to track user call
+        http_status = None
+        retry_after = None
+
+        try:
+            # --- Browser/Context setup (incl. resource blocking) lives in PlaywrightPool ---
+
+            # 1. Navigate to the new URL
+            with self._timed("navigate", url):
+                response = page.goto(url)
+                page.wait_for_load_state("load")
+            if response is not None:
+                # Reported to the HostThrottle by the caller
+                http_status = response.status
+                retry_after = response.headers.get("retry-after")
+
+            # 2. Define the scrape() function for the user
+            def user_scrape_function():
+                """Internal function exposed to user script as 'scrape()'."""
+                nonlocal scrape_called_by_user
+                scrape_called_by_user = True
+                try:
+                    if log_callback:
+                        log_callback(f"ℹ️ scrape() called by script on {page.url}")
+                    # Use the core extraction helper (current page URL, might have changed)
+                    scraped_row = self._extract_from_page(page, template, mode)
+                    collected_rows.append(scraped_row)
+                    if log_callback:
+                        log_callback(f"✅ scrape() successful, {len(scraped_row) - 1} categories found.")
+                except Exception as e:
+                    logging.error(f"Error during user-called scrape(): {e!r}")
+                    if log_callback:
+                        log_callback(f"❌ Error during user-called scrape(): {e!r}")
+
+
+            # 3. EXECUTE USER SCRIPT
+            if scrape_script:
+                logging.info(f"Executing scrape action script for {url}")
+                try:
+                    exec_globals = {
+                        'page': page,
+                        'time': time,
+                        'scrape': user_scrape_function,
+                    }
+                    if log_callback:
+                        exec_globals['log'] = log_callback
+                    if cancel_flag:
+                        exec_globals['is_cancelled'] = cancel_flag
+
+                    with self._timed("script", url):
+                        exec(scrape_script, exec_globals)
+                    logging.info(f"Successfully executed script for {url}")
+
+                except Exception as e:
+                    logging.error(f"Error executing scrape script for {url}: {e!r}")
+                    if log_callback:
+                        log_callback(f"❌ Script error on {url}: {e!r}")
+
+            # 4. AUTO-SCRAPE (Fallback)
+            if not scrape_called_by_user:
+                # --- START MODIFICATION ---
+                # Only log if a script *ran* but didn't call scrape().
+                # If no script was provided, this is just noise and slows down the app.
+                if log_callback and scrape_script:
+                    log_callback(f"ℹ️ Script finished. Auto-scraping final page state for {url}...")
+                # --- END MODIFICATION ---
+                try:
+                    scraped_row = self._extract_from_page(page, template, mode)
+                    collected_rows.append(scraped_row)
+
+
+                except Exception as e:
+                    logging.error(f"Error during auto-scrape: {e!r}")
+                    if log_callback:
+                        log_callback(f"❌ Error during auto-scrape: {e!r}")
+
+
+
+            return {"status": "ok", "scraped_rows": collected_rows,  # Return collected data
+                    "http_status": http_status, "retry_after": retry_after}
+        except Exception as e:
+            logging.info(f"Playwright processing failed for {url}: {e!r}")
+            return {"status": "error", "message": str(e), "exception": e}
+
+    def _playwright_context_args(self, cookie_file_path, log_callback=None):
+        """Browser context options; loads the saved session (cookies) if there is one."""
+        context_args = {}
+        if cookie_file_path:
+            try:
+                if os.path.exists(cookie_file_path) and os.path.getsize(cookie_file_path) > 0:
+                    with open(cookie_file_path, 'r', encoding='utf-8') as f:
+                        json.load(f)  # Test load
+                    context_args["storage_state"] = cookie_file_path
+                    if log_callback:
+                        log_callback(f"ℹ️ Loading session from {os.path.basename(cookie_file_path)}")
+                else:
+                    if log_callback:
+                        log_callback("⚠️ Cookie file not found or is empty. Proceeding without session.")
+            except Exception as e:
+                if log_callback:
+                    log_callback(f"❌ Error loading cookie file: {e!r}. Proceeding without session.")
+        return context_args
+
+    def _visit_with_playwright(self, pool, throttle, idx, num_urls, url, template, mode, scrape_script,
+                               log_callback=None, cancel_flag=None, error_log_file=None):
+        """
+        Runs one URL on the next free page of the pool.
+        Returns (scraped_rows, error_row).
+        """
+        try:
+            if url.startswith("view-source:"):
+                url = url[len("view-source:"):]
+
+            # Check robots.txt (using default UA for check)
+            with self._timed("robots", url):
+                allowed = self._is_allowed_by_robots(url, DEFAULT_USER_AGENT)
+            if not allowed:
+                self._log_error_to_file(error_log_file, url, "Disallowed by robots.txt")
+                if log_callback:
+                    log_callback(f"⚠️ [{idx}/{num_urls}] Skipped {url} — disallowed by robots.txt")
+                return [], {"url": url, "error": "Disallowed by robots.txt"}
+
+            retries = self.retry_policy.start()
+            while True:
+                # Politeness delay per host (never shorter than the host's Crawl-delay)
+                with self._timed("politeness", url):
+                    throttle.wait(url, self.robots.crawl_delay(url, DEFAULT_USER_AGENT))
+                retries.begin()
+
+                if log_callback:
+                    log_callback(f"🚀 [{idx}/{num_urls}] Navigating to {url}...")
+
+                page_result = pool.run(lambda page: self._process_playwright_page(
+                    page=page,
+                    url=url,
+                    template=template,
+                    mode=mode,
+                    scrape_script=scrape_script,
+                    log_callback=log_callback,
+                    cancel_flag=cancel_flag
+                ))
+
+                if page_result.get("http_status") is not None:
+                    gap = throttle.feedback(url, page_result["http_status"], page_result.get("retry_after"))
+                    if page_result["http_status"] in HostThrottle.THROTTLE_STATUSES and log_callback:
+                        log_callback(f"⚠️ [{idx}/{num_urls}] {urlparse(url).netloc} answered "
+                                     f"{page_result['http_status']}, slowing down to one request per {gap:.1f}s")
+
+                if page_result["status"] == "ok":
+                    if log_callback:
+                        log_callback(
+                            f"✅ [{idx}/{num_urls}] {url} scraped ({len(page_result['scraped_rows'])} items found)")
+                    return page_result["scraped_rows"], None
+
+                # Navigation failed (the pool replaces the broken page): retry per the RetryPolicy
+                error_message = page_result.get('message', 'Unknown Playwright processing error')
+                if not pool.alive or (cancel_flag and cancel_flag()):
+                    break
+                try:
+                    delay = self._after_failed_attempt(
+                        retries, throttle, idx, num_urls, url,
+                        page_result.get("exception") or RuntimeError(error_message), log_callback)
+                except Exception:
+                    break
+                if delay:
+                    with self._timed("retry_wait", url):
+                        time.sleep(delay)
+
+            # Page processing failed for good, log it and return the error
+            self._log_error_to_file(error_log_file, url, error_message)
+            logging.warning(f"Playwright processing failed for {url}: {error_message}")
+            if log_callback:
+                log_callback(f"❌ [{idx}/{num_urls}] {url} error: {error_message}")
+            return [], {"url": url, "error": error_message}
+
+        except Exception as e:
+            # This 'except' catches other errors (e.g., robots.txt failure)
+            logging.error(f"Error processing {url}: {e!r}")
+            if log_callback:
+                log_callback(f"❌ [{idx}/{num_urls}] {url} error: {e!r}")
+            self._log_error_to_file(error_log_file, url, repr(e))
+            return [], {"url": url, "error": repr(e)}
+
+    def _run_playwright_session(self, urls, template, mode, scrape_script, log_callback, headless, cancel_flag,
+                                cookie_file_path, timeout=60000, saver=None, error_log_file=None, start=1,
+                                num_urls=None):
+        """
+        Launches ONE Playwright browser instance, loads cookies once, and works through all URLs
+        on `browser_pages` pages in parallel, handing results to the BatchSaver in URL order.
+        urls: any iterable (read lazily); num_urls: total shown in progress messages.
+        start: index of the first URL (a resumed run continues the numbering).
+        """
+        if num_urls is None:
+            num_urls = start - 1 + len(urls)
+
+        if not PLAYWRIGHT_AVAILABLE:
+            if log_callback:
+                log_callback("❌ Playwright is not installed.")
+            return []  # Return empty list
+
+        context_args = self._playwright_context_args(cookie_file_path, log_callback)
+        throttle = HostThrottle(self.min_delay, self.max_delay)
+        try:
+            pool = PlaywrightPool(self.browser_pages, headless=headless, context_args=context_args,
+                                  timeout=timeout, log_callback=log_callback, blocker=self.blocker).start()
+        except Exception as e:
+            logging.error(f"A critical Playwright session error occurred: {e!r}")
+            if log_callback:
+                log_callback(f"💥 A critical Playwright error occurred: {e!r}")
+            return []
+
+        try:
+            def visit(idx, url):
+                with self._timed("url", url):
+                    return self._visit_with_playwright(pool, throttle, idx, num_urls, url, template, mode,
+                                                       scrape_script, log_callback, cancel_flag, error_log_file)
+
+            for idx, url, (scraped_rows, error_row) in map_in_order(visit, urls, pool.size, cancel_flag, start):
+                for r in scraped_rows:
+                    saver.add(scraped_row=r)
+                if error_row:
+                    saver.add(error_row=error_row)
+                saver.after_url(idx, num_urls, cancelled=bool(cancel_flag and cancel_flag()), url=url)
+
+                if not pool.alive:
+                    if log_callback:
+                        log_callback("💥 CRITICAL: Playwright context is unresponsive. Aborting run.")
+                    break
+
+            if cancel_flag and cancel_flag() and log_callback:
+                log_callback("⚠️ Scraping canceled by user.")
+        finally:
+            pool.close()
+        return []
+
+    def _extract_if_has_text(self, page_content, url, template, mode):
+        """Runs the extraction on fetched bytes, or returns None when the page has no visible text."""
+        pool = self._extraction_pool
+        if pool is not None and not pool.broken:
+            try:
+                return pool.extract(page_content, url, mode)
+            except BrokenProcessPool as e:
+                pool.mark_broken(e)
+        template = self._compiled(template)
+        with self._timed("parse", url):
+            page = ParsedPage(page_content, self._backend_for(template)).parse()
+            has_text = page.has_text()
+        if not has_text:
+            return None
+        return self._extract_from_content(
+            page_content=page_content,
+            url=url,
+            template=template,
+            mode=mode,
+            parsed_page=page
+        )
+
+    def _start_extraction_pool(self, template, log_callback=None):
+        """Starts the run's ExtractionPool; on failure the run extracts in-process."""
+        try:
+            self._extraction_pool = ExtractionPool(template, self.parser_backend, self.extraction_processes,
+                                                   collect_metrics=self.collect_metrics, on_timing=self._record,
+                                                   log_callback=log_callback)
+            if log_callback:
+                log_callback(f"ℹ️ Extracting pages in {self.extraction_processes} worker processes.")
+        except Exception as e:
+            logging.error(f"Could not start the extraction processes: {e!r}")
+            if log_callback:
+                log_callback(f"⚠️ Could not start the extraction processes, extracting in-process: {e!r}")
+
+    def _stop_extraction_pool(self):
+        pool, self._extraction_pool = self._extraction_pool, None
+        if pool is not None:
+            pool.close()
+
+    def _download(self, session, url):
+        """
+        GET a page and return its body. With the response cache on, a cached copy is revalidated
+        (If-None-Match/If-Modified-Since) and reused on 304; fresh 200 responses are stored.
+        """
+        cache = self.response_cache
+        if cache is None:
+            resp = session.get(url, timeout=self.timeout)
+            self._record("time_to_headers", resp.elapsed.total_seconds(), url)
+            resp.raise_for_status()
+            return resp.content
+
+        conditional = cache.conditional_headers(url)
+        resp = session.get(url, timeout=self.timeout, headers=conditional or None)
+        self._record("time_to_headers", resp.elapsed.total_seconds(), url)
+        if resp.status_code == 304 and conditional:
+            body = cache.read(url)
+            if body is not None:
+                return body
+            resp = session.get(url, timeout=self.timeout)  # Cached copy vanished: fetch it in full
+        resp.raise_for_status()
+        if resp.status_code == 200:
+            cache.store(url, resp.content, resp.headers)
+        return resp.content
+
+    def _after_failed_attempt(self, retries, throttle, idx, num_urls, url, error=None, progress_callback=None):
+        """
+        Shared by every engine after a failed attempt (error=None: the page came back empty).
+        Reports the HTTP status to the HostThrottle and asks the RetryPolicy what to do next.
+        Returns the backoff delay in seconds; raises when the URL is given up.
+        """
+        status = retry_after = None
+        if error is None:
+            kind = "empty"
+        else:
+            status = RetryPolicy.status_of(error)
+            kind = RetryPolicy.classify(error, status)
+            headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+            retry_after = headers.get("Retry-After") if headers else None
+        gap = throttle.feedback(url, status, retry_after) if status is not None else None
+
+        # A status says it all (aiohttp's error repr carries every header)
+        described = f"HTTP {status}" if status is not None else repr(error)
+        delay = retries.next_delay(kind, retry_after)
+        if delay is None:
+            # Dead links (DNS, 4xx) fail fast: retrying cannot help
+            if kind == "client":
+                raise ConnectionError(f"{url} answered HTTP {status}; not retried.")
+            if kind == "dns":
+                raise ConnectionError(f"Cannot resolve host {urlparse(url).hostname}; not retried.")
+            reason = "empty page" if error is None else f"{kind} error: {described}"
+            raise ConnectionError(f"Failed to get content from {url} after {retries.attempt} attempts ({reason}).")
+
+        if progress_callback:
+            if kind == "throttled":
+                progress_callback(f"⚠️ [{idx}/{num_urls}] {urlparse(url).netloc} answered {status}, "
+                                  f"slowing down to one request per {gap:.1f}s")
+            elif error is None:
+                progress_callback(f"⚠️ [{idx}/{num_urls}] Empty content on attempt {retries.attempt}, retrying...")
+            else:
+                progress_callback(f"❌ [{idx}/{num_urls}] Request error on attempt {retries.attempt}: {described} "
+                                  f"(retrying in {delay:.1f}s)")
+        return delay
+
+    def _fetch_and_extract(self, session, throttle, idx, num_urls, url, template, mode, error_log_file=None,
+                           progress_callback=None, escalate=False):
+        """
+        Fetches and extracts a SINGLE URL for the 'requests' engine.
+        Safe to call from several worker threads at once; returns (scraped_row, error_row).
+        escalate: (engine="auto") pages that look JS-rendered are not retried: (scraped_row, None) is returned
+                  at once, with whatever requests extracted (None if the page had no text), so the caller
+                  can hand the URL to Playwright. A JS notice (e.g. a comments widget's <noscript>) on a page
+                  whose required fields were all extracted is not a reason to escalate.
+        """
+        scraped_row = None
+        error_row = None
+
+        try:
+            if url.startswith("view-source:"):
+                url = url[len("view-source:"):]
+
+            if self.response_cache and self.response_cache.offline:
+                # Replay: no robots.txt, no delays, no network
+                with self._timed("cache_read", url):
+                    body = self.response_cache.read(url)
+                if body is None:
+                    raise ConnectionError(f"{url} is not in the response cache (replay mode).")
+                scraped_row = self._extract_if_has_text(body, url, template, mode)
+                if scraped_row is None:
+                    raise ValueError(f"Cached copy of {url} has no text content.")
+                if progress_callback:
+                    progress_callback(f"✅ [{idx}/{num_urls}] {url} scraped (from cache)")
+                return scraped_row, error_row
+
+            ua_for_robots = session.headers.get("User-Agent", DEFAULT_USER_AGENT)
+            with self._timed("robots", url):
+                allowed = self._is_allowed_by_robots(url, ua_for_robots, session)
+            if not allowed:
+                msg = f"⚠️ [{idx}/{num_urls}] Skipped {url} — disallowed by robots.txt"
+                error_row = {"url": url, "error": "Disallowed by robots.txt"}
+                self._log_error_to_file(error_log_file, url, "Disallowed by robots.txt")
+                if progress_callback:
+                    progress_callback(msg)
+                return scraped_row, error_row
+
+            retries = self.retry_policy.start()
+            while True:
+                try:
+                    # Every attempt waits for the host's next slot (backed off after 429/503)
+                    with self._timed("politeness", url):
+                        throttle.wait(url, self.robots.crawl_delay(url, ua_for_robots))
+                    retries.begin()
+                    with self._timed("fetch", url):
+                        content = self._download(session, url)
+                    throttle.feedback(url, 200)
+                    scraped_row = self._extract_if_has_text(content, url, template, mode)
+                    if escalate and (scraped_row is None or (
+                            JS_REQUIRED_PATTERNS.search(content)
+                            and self._compiled(template).missing_required(scraped_row, mode))):
+                        if progress_callback:
+                            progress_callback(f"ℹ️ [{idx}/{num_urls}] {url} looks JavaScript-rendered")
+                        return scraped_row, None
+                    if scraped_row is not None:
+                        break
+                    delay = self._after_failed_attempt(retries, throttle, idx, num_urls, url, None,
+                                                       progress_callback)
+                except requests.exceptions.RequestException as e:
+                    delay = self._after_failed_attempt(retries, throttle, idx, num_urls, url, e, progress_callback)
+                if delay:
+                    with self._timed("retry_wait", url):
+                        time.sleep(delay)
+
+            if progress_callback:
+                progress_callback(f"✅ [{idx}/{num_urls}] {url} scraped")
+
+        except Exception as e:
+            error_row = {"url": url, "error": repr(e)}
+            self._log_error_to_file(error_log_file, url, repr(e))
+            if progress_callback:
+                progress_callback(f"❌ [{idx}/{num_urls}] {url} error: {repr(e)}")
+
+        return scraped_row, error_row
+
+    def _run_auto_session(self, urls, template, mode, scrape_script, log_callback, headless, cancel_flag,
+                          cookie_file_path, saver=None, error_log_file=None, start=1, num_urls=None):
+        """
+        engine="auto": every URL is fetched with requests first and handed to a shared Playwright pool
+        only when the page looks JS-rendered or required template fields come back empty.
+        The EngineRouter learns per host which engine works and routes later URLs accordingly.
+        """
+        if num_urls is None:
+            num_urls = start - 1 + len(urls)
+        compiled = self._compiled(template)
+        throttle = HostThrottle(self.min_delay, self.max_delay)
+        router = EngineRouter()
+        sessions = HostSessions(self._make_session)
+        pool_lock = threading.Lock()
+        pool_state = {"pool": None, "failed": not PLAYWRIGHT_AVAILABLE}
+        if not PLAYWRIGHT_AVAILABLE and log_callback:
+            log_callback("⚠️ Playwright is not installed. 'Auto' will only use requests.")
+
+        def get_pool():
+            """The Playwright pool is started on the first escalation and shared by all workers."""
+            with pool_lock:
+                if pool_state["pool"] is None and not pool_state["failed"]:
+                    try:
+                        if log_callback:
+                            log_callback("ℹ️ Starting Playwright for JavaScript-rendered pages...")
+                        pool_state["pool"] = PlaywrightPool(
+                            self.browser_pages, headless=headless,
+                            context_args=self._playwright_context_args(cookie_file_path, log_callback),
+                            log_callback=log_callback, blocker=self.blocker).start()
+                    except Exception as e:
+                        pool_state["failed"] = True
+                        logging.error(f"A critical Playwright session error occurred: {e!r}")
+                        if log_callback:
+                            log_callback(f"💥 Playwright could not be started, 'Auto' will only use requests: {e!r}")
+                return pool_state["pool"]
+
+        def note(url, engine):
+            pinned = router.record(url, engine)
+            if pinned and log_callback:
+                log_callback(f"ℹ️ {urlparse(url).netloc}: using {pinned} for the rest of the run")
+
+        def visit(idx, url):
+            scraped_row = None
+            if router.choose(url) == "requests" or pool_state["failed"]:
+                escalate = router.may_escalate(url) and not pool_state["failed"]
+                scraped_row, error_row = self._fetch_and_extract(
+                    sessions.get(url), throttle, idx, num_urls, url, compiled, mode, error_log_file, log_callback,
+                    escalate=escalate)
+                if error_row:
+                    return [], error_row  # Network/HTTP errors are not a reason to start a browser
+                if scraped_row is not None and (not escalate or not compiled.missing_required(scraped_row, mode)):
+                    note(url, "requests")
+                    return [scraped_row], None
+                pool = get_pool()
+                if pool is None and scraped_row is not None:
+                    return [scraped_row], None  # Playwright failed to start: keep what requests found
+                if pool is not None and log_callback:
+                    log_callback(f"ℹ️ [{idx}/{num_urls}] Escalating {url} to Playwright...")
+            else:
+                pool = get_pool()
+            if pool is None:
+                # Playwright failed to start and nothing was extracted yet: one plain fetch, no escalation
+                scraped_row, error_row = self._fetch_and_extract(
+                    sessions.get(url), throttle, idx, num_urls, url, compiled, mode, error_log_file, log_callback)
+                return ([scraped_row] if scraped_row is not None else []), error_row
+
+            scraped_rows, error_row = self._visit_with_playwright(pool, throttle, idx, num_urls, url, compiled,
+                                                                  mode, scrape_script, log_callback, cancel_flag,
+                                                                  error_log_file)
+            if not scraped_rows and scraped_row is not None:
+                # The browser found nothing (or failed): the partial row from requests is still a result
+                note(url, "requests")
+                return [scraped_row], None
+            if scraped_rows:
+                browser_score = max(compiled.filled_required(r, mode) for r in scraped_rows)
+                # The browser only "worked" if it found more than the plain fetch did
+                note(url, "playwright" if browser_score > compiled.filled_required(scraped_row, mode) else "requests")
+            return scraped_rows, error_row
+
+        def timed_visit(idx, url):
+            with self._timed("url", url):
+                return visit(idx, url)
+
+        try:
+            for idx, url, (scraped_rows, error_row) in map_in_order(timed_visit, urls, self.workers, cancel_flag,
+                                                                    start):
+                for r in scraped_rows:
+                    saver.add(scraped_row=r)
+                if error_row:
+                    saver.add(error_row=error_row)
+                saver.after_url(idx, num_urls, cancelled=bool(cancel_flag and cancel_flag()), url=url)
+
+            if cancel_flag and cancel_flag() and log_callback:
+                log_callback("⚠️ Scraping canceled by user.")
+        finally:
+            sessions.close()
+            if pool_state["pool"] is not None:
+                pool_state["pool"].close()
+        return []
+
+    def _run_async_session(self, urls, template, mode, log_callback, cancel_flag, saver=None,
+                           error_log_file=None, start=1, num_urls=None):
+        """
+        Drives all fetches from ONE asyncio event loop with a shared aiohttp connection pool.
+        Parsing/extraction runs in the loop's default thread pool so it never blocks the network.
+        """
+        if not AIOHTTP_AVAILABLE:
+            if log_callback:
+                log_callback("❌ aiohttp is not installed. Install it with 'pip install aiohttp'.")
+            return []
+
+        try:
+            asyncio.run(self._async_fetch_all(urls, template, mode, log_callback, cancel_flag, saver,
+                                              error_log_file, start, num_urls))
+        except Exception as e:
+            logging.error(f"A critical async session error occurred: {e!r}")
+            if log_callback:
+                log_callback(f"💥 A critical async engine error occurred: {e!r}")
+        return []
+
+    def _aiohttp_trace_config(self):
+        """Feeds aiohttp's connection/DNS events into the same counters as TunedHTTPAdapter."""
+        trace = aiohttp.TraceConfig()
+
+        def counter(name):
+            async def on_event(session, context, params):
+                self._count(name)
+            return on_event
+
+        trace.on_request_start.append(counter("http_requests"))
+        trace.on_connection_create_end.append(counter("connections_opened"))
+        trace.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace.on_dns_resolvehost_start.append(counter("dns_lookups"))
+        return trace
+
+    async def _async_fetch_all(self, urls, template, mode, log_callback, cancel_flag, saver, error_log_file,
+                               start=1, num_urls=None):
+        if num_urls is None:
+            num_urls = start - 1 + len(urls)
+        loop = asyncio.get_running_loop()
+        throttle = HostThrottle(self.min_delay, self.max_delay)
+        host_limits = {}
+
+        connector = aiohttp.TCPConnector(limit=self.async_concurrency, limit_per_host=self.per_host_limit,
+                                         use_dns_cache=bool(self.dns_cache_ttl),
+                                         ttl_dns_cache=self.dns_cache_ttl or None)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self._default_headers(),
+                                         trace_configs=[self._aiohttp_trace_config()]) as session:
+            def launch(idx, url):
+                host = urlparse(url).netloc.lower()
+                if host not in host_limits:
+                    host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+                return asyncio.ensure_future(self._async_fetch_and_extract(
+                    session, host_limits[host], throttle, idx, num_urls, url, template, mode,
+                    error_log_file, log_callback))
+
+            async def consume(idx, url, task):
+                scraped_row, error_row = await task
+                saver.add(scraped_row=scraped_row, error_row=error_row)
+                # Batch saves touch the disk, keep them off the event loop.
+                await loop.run_in_executor(None, saver.after_url, idx, num_urls,
+                                           bool(cancel_flag and cancel_flag()), url)
+
+            # Tasks are consumed in URL order; at most `async_concurrency` are in flight.
+            pending = deque()
+            for idx, url in enumerate(urls, start=start):
+                if cancel_flag and cancel_flag():
+                    break
+                pending.append((idx, url, launch(idx, url)))
+                if len(pending) >= self.async_concurrency:
+                    await consume(*pending.popleft())
+
+            while pending:
+                if cancel_flag and cancel_flag():
+                    for _, _, task in pending:
+                        if not task.done():
+                            task.cancel()
+                    await asyncio.gather(*(task for _, _, task in pending), return_exceptions=True)
+                    # Keep only the finished in-order prefix.
+                    while pending and not pending[0][2].cancelled():
+                        await consume(*pending.popleft())
+                    break
+                await consume(*pending.popleft())
+
+        if cancel_flag and cancel_flag() and log_callback:
+            log_callback("⚠️ Scraping canceled by user.")
+
+    async def _async_fetch_and_extract(self, session, host_limit, throttle, idx, num_urls, url, template, mode,
+                                       error_log_file=None, progress_callback=None):
+        """Async twin of _fetch_and_extract; returns (scraped_row, error_row)."""
+        loop = asyncio.get_running_loop()
+        scraped_row = None
+        error_row = None
+        url_started = time.perf_counter()
+
+        try:
+            if url.startswith("view-source:"):
+                url = url[len("view-source:"):]
+
+            ua_for_robots = session.headers.get("User-Agent", DEFAULT_USER_AGENT)
+            stage_started = time.perf_counter()
+            allowed = await loop.run_in_executor(None, self._is_allowed_by_robots, url, ua_for_robots)
+            self._record("robots", time.perf_counter() - stage_started, url)
+            if not allowed:
+                msg = f"⚠️ [{idx}/{num_urls}] Skipped {url} — disallowed by robots.txt"
+                error_row = {"url": url, "error": "Disallowed by robots.txt"}
+                self._log_error_to_file(error_log_file, url, "Disallowed by robots.txt")
+                if progress_callback:
+                    progress_callback(msg)
+                return scraped_row, error_row
+
+            proxy = (self.proxies or {}).get(urlparse(url).scheme)
+
+            retries = self.retry_policy.start()
+            while True:
+                try:
+                    stage_started = time.perf_counter()
+                    await asyncio.sleep(throttle.reserve(url, self.robots.crawl_delay(url, ua_for_robots)))
+                    self._record("politeness", time.perf_counter() - stage_started, url)
+                    retries.begin()
+                    async with host_limit:
+                        stage_started = time.perf_counter()
+                        async with session.get(url, proxy=proxy) as resp:
+                            self._record("time_to_headers", time.perf_counter() - stage_started, url)
+                            resp.raise_for_status()
+                            body = await resp.read()
+                        self._record("fetch", time.perf_counter() - stage_started, url)
+                    throttle.feedback(url, resp.status)
+                    scraped_row = await loop.run_in_executor(None, self._extract_if_has_text, body, url,
+                                                             template, mode)
+                    if scraped_row is not None:
+                        break
+                    delay = self._after_failed_attempt(retries, throttle, idx, num_urls, url, None,
+                                                       progress_callback)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    delay = self._after_failed_attempt(retries, throttle, idx, num_urls, url, e, progress_callback)
+                if delay:
+                    stage_started = time.perf_counter()
+                    await asyncio.sleep(delay)
+                    self._record("retry_wait", time.perf_counter() - stage_started, url)
+
+            if progress_callback:
+                progress_callback(f"✅ [{idx}/{num_urls}] {url} scraped")
+
+        except Exception as e:
+            error_row = {"url": url, "error": repr(e)}
+            self._log_error_to_file(error_log_file, url, repr(e))
+            if progress_callback:
+                progress_callback(f"❌ [{idx}/{num_urls}] {url} error: {repr(e)}")
+        finally:
+            self._record("url", time.perf_counter() - url_started, url)
+
+        return scraped_row, error_row
+
+    def run_scraper_from_content(self, template_content, urls_text, output_name, mode="text_only",
+                                 progress_callback=None, cancel_flag=None, engine="requests", scrape_script=None,
+                                 headless=True, cookie_file_path=None,
+                                 # --- START: Add main_tag_keys ---
+                                 main_tag_keys=None,
+                                 # --- END: Add main_tag_keys ---
+                                 resume=False, urls_file=None, output_dir=None
+                                 ):
+        try:
+            template = json.loads(template_content)
+        except json.JSONDecodeError:
+            return {"status": "error", "message": "Invalid JSON in template file."}
+
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w", encoding="utf-8") as tmp:
+            json.dump(template, tmp, indent=2, ensure_ascii=False)
+            tmp_filename = tmp.name
+
+        result = self.run_scraper(tmp_filename, urls_text, output_name, mode, progress_callback, cancel_flag, engine,
+                                  scrape_script, headless, cookie_file_path=cookie_file_path,
+                                  # --- START: Pass main_tag_keys ---
+                                  main_tag_keys=main_tag_keys,
+                                  # --- END: Pass main_tag_keys ---
+                                  resume=resume, urls_file=urls_file, output_dir=output_dir
+                                  )
+        os.remove(tmp_filename)
+        return result
+
+    def run_scraper(self, template_file, urls_text, output_name, mode="text_only",
+                    progress_callback=None, cancel_flag=None, engine="requests", scrape_script=None, headless=True,
+                    cookie_file_path=None,
+                    # --- START: Add main_tag_keys ---
+                    main_tag_keys=None,
+                    # --- END: Add main_tag_keys ---
+                    resume=False, urls_file=None, output_dir=None
+                    ):
+        """
+        urls_text: pasted URLs (one per line) or any iterable of URLs; both are read lazily.
+        urls_file: path of a text file with one URL per line, streamed instead of urls_text.
+        resume: continue the last run with the same output name, template and mode from the URL after
+                its last checkpoint (see RunManifest) instead of deleting its files and starting over.
+        output_dir: folder for the output files (created if needed; default: OUTPUT_DIR)
+        """
+        output_dir = output_dir or OUTPUT_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        try:
+            with open(template_file, encoding="utf-8") as f:
+                template = json.load(f)
+        except FileNotFoundError:
+            return {"status": "error", "message": f"Template {template_file} not found."}
+
+        # URLs are streamed (and de-duplicated) from the text/iterable/file; only the total is counted up front.
+        url_source = UrlSource(urls_text, path=urls_file)
+        try:
+            num_urls = url_source.count()
+        except OSError as e:
+            return {"status": "error", "message": f"Cannot read URL file: {e!r}"}
+        if num_urls is None:
+            num_urls = "?"  # Unsized iterable: progress is shown as idx/?
+        urls = iter(url_source)
+        results = []  # This will hold ALL results for the final return
+
+        # --- Checkpoint of an earlier run with this output name ---
+        manifest = RunManifest(os.path.join(output_dir, output_name + "_manifest.json"))
+        fingerprint = RunManifest.fingerprint(template, mode)
+        resume_state = None
+        if resume:
+            resume_state = manifest.load()
+            if resume_state and resume_state.get("fingerprint") != fingerprint:
+                return {"status": "error",
+                        "message": "The template or mode differs from the run being resumed; cannot resume."}
+            if resume_state is None and progress_callback:
+                progress_callback("ℹ️ No unfinished run to resume. Starting a fresh run.")
+        completed = resume_state.get("completed", 0) if resume_state else 0
+        urls_digest = hashlib.sha256()
+        if resume_state:
+            for url in islice(urls, completed):  # Skip (and fingerprint) the URLs saved by the last run
+                urls_digest.update(url.encode("utf-8") + b"\n")
+            if url_source.yielded < completed or urls_digest.hexdigest() != resume_state.get("urls_digest"):
+                return {"status": "error",
+                        "message": "The URL list differs from the run being resumed; cannot resume."}
+            if progress_callback:
+                progress_callback(f"ℹ️ Resuming after URL {completed}/{num_urls}.")
+
+        # --- START: Define all output paths ---
+        ext = ".json" if mode in ["text_only", "text_metadata"] else ".txt"
+        output_file = os.path.join(output_dir, output_name + ext)  # TXT file or "text_only" JSON
+
+        export_folder = None
+        json_file = None  # Master JSON file (for text_only or metadata)
+        xlsx_file = None  # Metadata XLSX file
+        metadata_sink = None  # Writes TXT files and the XLSX in 'text_metadata' mode
+        error_log_file = os.path.join(output_dir, output_name + "_errors.txt")  # <-- ADD THIS
+        fresh_run = resume_state is None
+
+        # --- Clear old files for a fresh run ---
+        if fresh_run:
+            manifest.remove()
+            if os.path.exists(error_log_file): os.remove(error_log_file)  # <-- ADD THIS
+
+        if mode == "text_metadata":
+            export_folder = os.path.join(output_dir, output_name)
+            os.makedirs(export_folder, exist_ok=True)
+            # This JSON file stores all raw scraped data for metadata mode
+            json_file = os.path.join(export_folder, "scraped_data.json")
+            xlsx_file = os.path.join(export_folder, "metadane.xlsx")
+            metadata_sink = MetadataSink(export_folder, xlsx_file, main_tag_keys,
+                                         start_index=resume_state.get("metadata_next_index", 0) if resume_state else 0)
+            # Clear old files
+            if fresh_run:
+                if os.path.exists(json_file): os.remove(json_file)
+                if os.path.exists(xlsx_file): os.remove(xlsx_file)
+                if os.path.exists(metadata_sink.staging_file): os.remove(metadata_sink.staging_file)
+        elif mode == "text_only":
+            json_file = output_file
+            # Clear old file for a fresh run
+            if fresh_run and os.path.exists(json_file): os.remove(json_file)
+        elif mode == "urls_only":
+            # Clear old file for a fresh run
+            if fresh_run and os.path.exists(output_file): os.remove(output_file)
+
+        # JSON rows are streamed into a JSON Lines file; with output_format="json" it becomes
+        # a regular JSON array once the run ends.
+        jsonl_file = None
+        if json_file:
+            jsonl_file = os.path.splitext(json_file)[0] + ".jsonl"
+            if fresh_run and os.path.exists(jsonl_file): os.remove(jsonl_file)
+        final_json_file = json_file if self.output_format == "json" else None
+        # --- END: Define all output paths ---
+
+        # --- START: Determine final output path for message ---
+        final_output_path = output_file
+        if mode == "text_metadata":
+            final_output_path = export_folder
+        elif mode == "text_only":
+            final_output_path = final_json_file or jsonl_file
+        # --- END: Determine final output path for message ---
+
+        if resume_state and resume_state.get("finished"):
+            if progress_callback:
+                progress_callback("✅ This run has already finished. Nothing to resume.")
+            return {"status": "ok", "filename": final_output_path, "count": 0, "results": results,
+                    "template": template}
+
+        # Stage timings of this run, reported in <output name>_perf.json when it ends
+        self.metrics = RunMetrics() if self.collect_metrics else None
+
+        if resume_state:
+            # Cut off anything written after the last checkpoint (a batch interrupted by a crash)
+            for path, size in resume_state.get("offsets", {}).items():
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+
+        saver = BatchSaver(self, mode, output_file=output_file, json_file=jsonl_file,
+                           final_json_file=final_json_file, metadata_sink=metadata_sink,
+                           log_callback=progress_callback, manifest=manifest, fingerprint=fingerprint,
+                           completed=completed, urls_digest=urls_digest)
+
+        # Selectors are classified and compiled once; every engine reuses the result for all URLs.
+        compiled_template = CompiledTemplate(template)
+        compiled_template.report(progress_callback)
+
+        if self.response_cache and self.response_cache.offline and engine != "playwright":
+            # Replay mode never touches the network, so neither escalation nor the async engine apply
+            engine = "requests"
+            if progress_callback:
+                progress_callback("ℹ️ Replaying pages from the response cache (no network).")
+
+        # Parsing and extraction of fetched pages can run in worker processes (Playwright extracts in the page)
+        if self.extraction_processes and engine != "playwright":
+            self._start_extraction_pool(template, progress_callback)
+
+        try:
+            if engine == "playwright":
+                # Playwright engine handles its own session and loop
+                results = self._run_playwright_session(
+                    urls=urls,
+                    template=compiled_template,
+                    mode=mode,
+                    scrape_script=scrape_script,
+                    log_callback=progress_callback,
+                    headless=headless,
+                    cancel_flag=cancel_flag,
+                    cookie_file_path=cookie_file_path,
+                    saver=saver,
+                    error_log_file=error_log_file,
+                    start=completed + 1,
+                    num_urls=num_urls
+                )
+            elif engine == "auto":
+                # Requests first, Playwright only for pages that need it (learned per host)
+                self._run_auto_session(
+                    urls=urls,
+                    template=compiled_template,
+                    mode=mode,
+                    scrape_script=scrape_script,
+                    log_callback=progress_callback,
+                    headless=headless,
+                    cancel_flag=cancel_flag,
+                    cookie_file_path=cookie_file_path,
+                    saver=saver,
+                    error_log_file=error_log_file,
+                    start=completed + 1,
+                    num_urls=num_urls
+                )
+            elif engine == "async":
+                self._run_async_session(
+                    urls=urls,
+                    template=compiled_template,
+                    mode=mode,
+                    log_callback=progress_callback,
+                    cancel_flag=cancel_flag,
+                    saver=saver,
+                    error_log_file=error_log_file,
+                    start=completed + 1,
+                    num_urls=num_urls
+                )
+            else:
+                # 'requests' engine: a bounded pool of fetch workers, results consumed in URL order.
+                # Workers share one session (and connection pool) per host; politeness delays are tracked per host.
+                throttle = HostThrottle(self.min_delay, self.max_delay)
+                sessions = HostSessions(self._make_session)
+
+                def fetch(idx, url):
+                    with self._timed("url", url):
+                        return self._fetch_and_extract(sessions.get(url), throttle, idx, num_urls, url,
+                                                       compiled_template, mode, error_log_file, progress_callback)
+
+                try:
+                    for idx, url, (scraped_row, error_row) in map_in_order(fetch, urls, self.workers, cancel_flag,
+                                                                            completed + 1):
+                        saver.add(scraped_row=scraped_row, error_row=error_row)
+                        saver.after_url(idx, num_urls, cancelled=bool(cancel_flag and cancel_flag()), url=url)
+                finally:
+                    sessions.close()
+
+                if cancel_flag and cancel_flag() and progress_callback:
+                    progress_callback("⚠️ Scraping canceled by user.")
+        finally:
+            self._stop_extraction_pool()
+
+        if url_source.duplicates and progress_callback:
+            progress_callback(f"ℹ️ {url_source.duplicates} duplicate URLs skipped.")
+        # Complete only if the whole input was read and every URL handed out was also saved
+        saver.finish(complete=url_source.exhausted and saver.last_idx >= url_source.yielded)
+        self.robots.save()
+        if self.response_cache:
+            self.response_cache.save()
+
+        perf_file = None
+        if self.metrics:
+            perf_file = os.path.join(output_dir, output_name + "_perf.json")
+            report = self.metrics.save(perf_file, engine=engine, mode=mode, workers=self.workers,
+                                       resumed_after=completed)
+            self.metrics = None
+            if progress_callback:
+                progress_callback(RunMetrics.summary_line(report))
+                progress_callback(f"ℹ️ Performance report saved to {os.path.basename(perf_file)}")
+
+        return {"status": "ok", "filename": final_output_path, "count": len(results), "results": results,
+                "template": template, "perf_file": perf_file}
+
+
+if IMPORT_TIMES is not None:
+    print(import_report("scrapuj_core imported"), file=sys.stderr)